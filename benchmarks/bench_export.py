@@ -0,0 +1,152 @@
+"""
+End to end benchmarks of the exports against the local mock API (benchmarks/mock_api.py), no network needed.
+
+    python benchmarks/bench_export.py --account-groups 20 --tests 1000 --latency 0.02
+    python benchmarks/bench_export.py --rate-limit 200 --rate-window 2 --burst-every 50 --scenario pipeline
+
+Every scenario runs once for the throughput and, unless --no-memory, once more under tracemalloc for
+the peak memory. The mock org, latency, pagination and rate limit behaviour come from the command
+line, --json saves the results so two runs (e.g. before and after a change) can be compared.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+if __package__ is None:
+    sys.path.append(str(ROOT))
+
+from benchmarks.mock_api import start_mock_api, add_mock_arguments, mock_options, ORG_NAME
+
+
+def fresh_project(workdir: str) -> str:
+
+    project = os.path.join(workdir, "project")
+    shutil.rmtree(project, ignore_errors=True)
+    os.makedirs(project)
+    return project
+
+
+def build_scenarios(workdir: str) -> dict:
+
+    """name -> function running the scenario and returning the number of items it processed."""
+
+    # Imported after the environment points to the mock API
+    from services.thousandeyes_service import get_account_groups, get_existant_tests
+    from controller.create_terraform import create_import_terraform
+    from services.pipeline_service import run_export_pipeline
+    from services.hydration_service import run_resource_export
+    from helpers.list_tests import get_all_tests
+    from helpers.list_agents import get_all_agents, a_write_to_csv
+    from services.connector_service import run_in_session
+
+    accounts = get_account_groups()
+    tests = get_existant_tests(accounts, concurrent=True)
+
+    def count_tests(existing_tests: dict) -> int:
+        return sum(len(t) for t in existing_tests.values())
+
+    def terraform():
+        fresh_project(workdir)
+        create_import_terraform(existing_tests=tests)
+        return count_tests(tests)
+
+    return {
+        "get_existant_tests": lambda: count_tests(get_existant_tests(accounts, concurrent=False)),
+        "get_existant_tests_async": lambda: count_tests(get_existant_tests(accounts, concurrent=True)),
+        "get_all_tests": lambda: sum(1 for _ in get_all_tests()),
+        "get_all_agents": lambda: sum(1 for _ in get_all_agents()),
+        "agents_csv_async": lambda: run_in_session(a_write_to_csv(os.path.join(workdir, "agents_list.csv.gz"), compress=True)),
+        "create_import_terraform": terraform,
+        "pipeline": lambda: run_export_pipeline(accounts, file_path=fresh_project(workdir)),
+        "hydrate_resources": lambda: run_resource_export(accounts, file_path=fresh_project(workdir)),
+    }
+
+
+def measure(server, scenario, memory: bool) -> dict:
+
+    requests, throttled = server.requests, server.throttled
+
+    if memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    items = scenario()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "items": items,
+        "seconds": round(elapsed, 4),
+        "items_per_s": round(items / elapsed if elapsed else 0, 1),
+        "requests": server.requests - requests,
+        "throttled": server.throttled - throttled,
+    }
+
+    if memory:
+        result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1048576, 2)
+        tracemalloc.stop()
+
+    return result
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Export benchmarks against the local mock API")
+    add_mock_arguments(parser)
+    parser.add_argument("--scenario", action="append", help="scenario to run (repeatable), every scenario by default")
+    parser.add_argument("--concurrency", type=int, default=10, help="FETCH_CONCURRENCY")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--json", metavar="PATH", help="save the results as JSON")
+    args = parser.parse_args()
+
+    server = start_mock_api(**mock_options(args))
+
+    # Logs, names state and generated files stay in a temp dir, the repository is not touched
+    invocation_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="te-bench-")
+    os.makedirs(os.path.join(workdir, "logs"))
+    os.chdir(workdir)
+
+    os.environ.update({
+        "TE_API_URL": server.url,
+        "ORG_NAME": ORG_NAME,
+        "API_TOKEN": "benchmark",
+        "TERRAFORM_PROJECT_PATH": "project",
+        "HTTP_CACHE": "false",
+        "NAMES_STATE_FILE": "",
+        "FETCH_CONCURRENCY": str(args.concurrency),
+        "RATE_LIMIT": str(args.rate_limit or 100000),
+    })
+
+    scenarios = build_scenarios(workdir)
+    selected = args.scenario or list(scenarios)
+    results = {}
+
+    print(f"{'scenario':26} {'items':>8} {'seconds':>9} {'items/s':>10} {'requests':>9} {'429':>5} {'peak MB':>8}")
+
+    for name in selected:
+
+        result = measure(server, scenarios[name], memory=False)
+        if not args.no_memory:
+            result["peak_mb"] = measure(server, scenarios[name], memory=True)["peak_mb"]
+
+        results[name] = result
+        print(
+            f"{name:26} {result['items']:8d} {result['seconds']:9.3f} {result['items_per_s']:10.1f} "
+            f"{result['requests']:9d} {result['throttled']:5d} {result.get('peak_mb', float('nan')):8.2f}"
+        )
+
+    if args.json:
+        with open(os.path.join(invocation_dir, args.json), "w") as f:
+            json.dump({"mock": mock_options(args), "results": results}, f, indent=2)
+
+    server.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,158 @@
+"""
+Benchmark of the main.tf write-back: string concatenation writer used by update_terraform before the
+renderer vs controller.hcl_renderer.write_terraform, on 20k resources built by generate_resource_block.
+Reports wall time and peak memory of each writer.
+
+    python benchmarks/bench_hcl_renderer.py [resources]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+if __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import hcl2
+from controller.hcl_renderer import write_terraform
+from controller.update_terraform import generate_resource_block
+
+
+class FixtureTest:
+
+    """Stand-in of the template test models (controller/read_template.py) with what generate_resource_block reads."""
+
+    type = 'http-server'
+    agentsLabel = 'fixture --> fixture'
+
+    def __init__(self, i: int):
+
+        self.testName = f'HTTP check "{i}"\\ {{prod}}'
+        self.agents = [{'agentId': 100 + j} for j in range(3)]
+        self._fields = {
+            'testName': self.testName,
+            'interval': 60,
+            'enabled': True,
+            'url': f'https://example.com/{i}?a=1&b=2',
+            'alertsEnabled': False,
+            'agents': self.agents,
+        }
+
+    def dict(self, exclude_none: bool = False, exclude=()) -> dict:
+
+        return {key: value for key, value in self._fields.items() if key not in exclude}
+
+
+def build_fixture(resources: int) -> dict:
+
+    """
+    Resources built by generate_resource_block like in update_terraform: half of them updated with a
+    new alias, half keeping the provider of the existing resource as hcl2 parsed it.
+    """
+
+    aliases = [f'account_{i}' for i in range(20)]
+
+    terraform_data = {
+        'provider': [{'thousandeyes': {'alias': alias, 'token': '${var.thousandeyes_token}', 'account_group_id': str(1000 + i)}}
+                     for i, alias in enumerate(aliases)],
+        'resource': [],
+    }
+
+    for i in range(resources):
+
+        alias = aliases[i % len(aliases)]
+
+        if i % 2:
+            block = generate_resource_block(FixtureTest(i), alias)
+        else:
+            block = generate_resource_block(FixtureTest(i), None, existing_resource_config={'provider': f'${{thousandeyes.{alias}}}'})
+
+        terraform_data['resource'].append(block)
+
+    return terraform_data
+
+
+def legacy_write(tf_file, terraform_data: dict) -> None:
+
+    """Writer of update_terraform before hcl_renderer (kept here only to compare)."""
+
+    tf_content = ''
+    if 'provider' in terraform_data:
+        for provider in terraform_data['provider']:
+            for provider_name, provider_config in provider.items():
+                tf_content += f'provider "{provider_name}" {{\n'
+                for k, v in provider_config.items():
+                    tf_content += f'  {k} = "{v}"\n'
+                tf_content += '}\n\n'
+
+    if 'resource' in terraform_data:
+        for resource in terraform_data['resource']:
+            for resource_type, resources in resource.items():
+                for resource_name, resource_config in resources.items():
+                    tf_content += f'resource "{resource_type}" "{resource_name}" {{\n'
+                    for k, v in resource_config.items():
+                        if isinstance(v, bool):
+                            tf_content += f'  {k} = {"true" if v else "false"}\n'
+                        elif isinstance(v, str):
+                            if k == 'provider':
+                                if '${' in v:
+                                    v = v.strip("${}")
+                                tf_content += f'  {k} = {v}\n'
+                            else:
+                                tf_content += f'  {k} = "{v}"\n'
+                        elif isinstance(v, list) and k == 'agents':
+                            for agent in v:
+                                tf_content += '  agents {\n'
+                                for ak, av in agent.items():
+                                    tf_content += f'    {ak} = {av}\n'
+                                tf_content += '  }\n'
+                        else:
+                            tf_content += f'  {k} = {v}\n'
+                    tf_content += '}\n\n'
+    tf_file.write(tf_content)
+
+
+def run(name: str, writer, terraform_data: dict, path: str) -> float:
+
+    start = time.perf_counter()
+    with open(path, 'w') as tf_file:
+        writer(tf_file, terraform_data)
+    elapsed = time.perf_counter() - start
+
+    # Second pass only for the memory, tracemalloc slows the writers down
+    tracemalloc.start()
+    with open(path, 'w') as tf_file:
+        writer(tf_file, terraform_data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{name:<10} {elapsed:8.3f}s  file {os.path.getsize(path) / 1e6:6.1f} MB  peak {peak / 1e6:7.2f} MB')
+    return elapsed
+
+
+if __name__ == "__main__":
+
+    resources = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    terraform_data = build_fixture(resources)
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        print(f'{resources} resources')
+        legacy = run('legacy', legacy_write, terraform_data, os.path.join(tmp, 'legacy.tf'))
+        renderer = run('renderer', write_terraform, terraform_data, os.path.join(tmp, 'renderer.tf'))
+        print(f'time ratio {renderer / legacy:8.2f}x (renderer / legacy)')
+
+        # Round trip check on a sample: the renderer output must parse back to the same data
+        sample = build_fixture(200)
+        sample_path = os.path.join(tmp, 'sample.tf')
+        with open(sample_path, 'w') as tf_file:
+            write_terraform(tf_file, sample)
+        with open(sample_path, 'r') as tf_file:
+            content = tf_file.read()
+        parsed = hcl2.loads(content)
+        # provider tiene que salir como referencia (provider = thousandeyes.alias), terraform rechaza el string
+        bare = 'provider = "' not in content
+        print('round trip', 'ok' if parsed['resource'] == sample['resource'] and bare else 'MISMATCH')
@@ -0,0 +1,119 @@
+"""
+HTTP/1.1 vs HTTP/2 throughput of the connector against the local mock API, at several concurrency levels.
+
+    python benchmarks/bench_http.py --requests 2000 --levels 1,10,50,100 --latency 0.02
+    python benchmarks/bench_http.py --max-connections 10 --levels 50,200
+
+Every request goes through a_request_with_retry (rate limit governor, retries, metrics) with a client
+built by client_options, so what changes between the rows is only the protocol and the pool. The
+HTTP/2 rows need the optional h2 package, they are skipped without it. "conns" is the number of TCP
+connections the mock accepted during the row.
+
+The mock runs in the same process: the HTTP/1.1 server is a thread per connection and the HTTP/2 one a
+single event loop, so on a small machine the high concurrency HTTP/1.1 rows also measure the mock.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+if __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.mock_api import start_mock_api, start_mock_h2_api, add_mock_arguments, mock_options, MockOrg
+
+
+async def run_level(url: str, aids: list, requests: int, concurrency: int, http2: bool) -> dict:
+
+    import httpx
+    from config.configuration import config
+    from services.connector_service import client_options, a_request_with_retry
+    from services.metrics_service import percentile
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(client, index):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            status, _ = await a_request_with_retry(client, 'GET', f'{url}tests', headers=config.headers, params={"aid": aids[index % len(aids)]})
+            latencies.append(time.perf_counter() - start)
+            errors += status != 200
+
+    async with httpx.AsyncClient(**client_options(http2=http2)) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, index) for index in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    return {
+        "requests_per_s": round(requests / elapsed, 1),
+        "seconds": round(elapsed, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="HTTP/1.1 vs HTTP/2 connector benchmark against the local mock API")
+    add_mock_arguments(parser)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per row")
+    parser.add_argument("--levels", default="1,10,50,100", help="concurrency levels, comma separated")
+    parser.add_argument("--max-connections", type=int, default=100, help="HTTP_MAX_CONNECTIONS of the pool")
+    parser.add_argument("--json", metavar="PATH", help="save the results as JSON")
+    args = parser.parse_args()
+
+    server = start_mock_api(**mock_options(args))
+
+    try:
+        h2_url = start_mock_h2_api(server)
+    except RuntimeError as e:
+        h2_url = None
+        print(f"HTTP/2 rows skipped: {e}")
+
+    invocation_dir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="te-bench-http-")
+    os.makedirs(os.path.join(workdir, "logs"))
+    os.chdir(workdir)
+
+    os.environ.update({
+        "TE_API_URL": server.url,
+        "API_TOKEN": "benchmark",
+        "HTTP_CACHE": "false",
+        "RATE_LIMIT": str(args.rate_limit or 1000000),
+        "HTTP_MAX_CONNECTIONS": str(args.max_connections),
+        "HTTP_MAX_KEEPALIVE": str(args.max_connections),
+    })
+
+    aids = [group["aid"] for group in MockOrg(account_groups=args.account_groups).account_groups]
+    protocols = [("HTTP/1.1", server.url, False)] + ([("HTTP/2", h2_url, True)] if h2_url else [])
+    results = []
+
+    print(f"{'protocol':9} {'conc':>5} {'req/s':>9} {'seconds':>8} {'p50 ms':>8} {'p95 ms':>8} {'conns':>6} {'errors':>6}")
+
+    for level in [int(value) for value in args.levels.split(",")]:
+        for name, url, http2 in protocols:
+
+            connections = server.connections
+            result = asyncio.run(run_level(url, aids, args.requests, level, http2))
+            result.update(protocol=name, concurrency=level, connections=server.connections - connections)
+            results.append(result)
+
+            print(
+                f"{name:9} {level:5d} {result['requests_per_s']:9.1f} {result['seconds']:8.3f} {result['p50_ms']:8.2f} "
+                f"{result['p95_ms']:8.2f} {result['connections']:6d} {result['errors']:6d}"
+            )
+
+    if args.json:
+        with open(os.path.join(invocation_dir, args.json), "w") as f:
+            json.dump({"mock": mock_options(args), "max_connections": args.max_connections, "results": results}, f, indent=2)
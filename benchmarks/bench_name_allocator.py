@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of the test resource naming: format_terraform_identifier with a names_seen set vs
+NameAllocator, over synthetic test names where most of them collide ("HTTP check").
+
+    python benchmarks/bench_name_allocator.py [names]
+
+The run without unique hints is the worst case of the suffix probing (every collision walks _2, _3, ...),
+so the format_terraform_identifier side of it is capped to keep the benchmark short.
+"""
+
+import sys
+import time
+import random
+from pathlib import Path
+
+if __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from services.thousandeyes_service import format_terraform_identifier, NameAllocator
+
+PROBING_CAP = 20000
+
+
+def synthetic_names(count: int) -> list:
+
+    random.seed(7)
+    common = ["HTTP check", "DNS check", "Page Load - Home", "Agent to Server 443"]
+    return [(random.choice(common) if random.random() < 0.8 else f"Test {i} / prod", str(5000000 + i)) for i in range(count)]
+
+
+def with_identifier(names: list, hints: bool) -> list:
+
+    seen = set()
+    result = []
+    for name, test_id in names:
+        candidate = format_terraform_identifier(name, "test", names_seen=seen, unique_hint=test_id if hints else None)
+        seen.add(candidate)
+        result.append(candidate)
+    return result
+
+
+def with_allocator(names: list, hints: bool) -> list:
+
+    allocator = NameAllocator("test")
+    return [allocator.allocate(name, unique_hint=test_id if hints else None) for name, test_id in names]
+
+
+def timed(func, *args):
+
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    names = synthetic_names(count)
+
+    for hints in (True, False):
+
+        sample = names if hints else names[:min(count, PROBING_CAP)]
+        old_time, old_names = timed(with_identifier, sample, hints)
+        new_time, new_names = timed(with_allocator, sample, hints)
+
+        label = 'with test id hints' if hints else 'without hints'
+        print(f'{len(sample)} names {label}')
+        print(f'  format_terraform_identifier {old_time:8.3f}s')
+        print(f'  NameAllocator               {new_time:8.3f}s  ({old_time / new_time:.1f}x, same names: {old_names == new_names})')
+
+    if count > PROBING_CAP:
+        new_time, _ = timed(with_allocator, names, False)
+        print(f'{count} names without hints')
+        print(f'  NameAllocator               {new_time:8.3f}s')
@@ -0,0 +1,95 @@
+"""
+Memory benchmark of the get_existant_tests result: the old {(alias, aid): [[name, id, type], ...]} layout
+vs the {AccountGroup: TestTable} records, built from the same synthetic API pages.
+
+    python benchmarks/bench_records.py [account groups] [tests per account group]
+
+Every account group page is dropped once it is collected, like in get_existant_tests, so what is
+measured is what stays in memory for the export. The NameAllocator (resource names and the test ids
+it keeps as keys) is the same for both layouts, it is measured apart and subtracted.
+"""
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+if __package__ is None:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.mock_api import MockOrg
+from services.thousandeyes_service import NameAllocator, _named_tests, _collect_tests
+from controller.create_terraform import iter_tests
+
+
+def legacy_collect(existing_tests: dict, allocator: NameAllocator, alias: str, aid, tests):
+
+    # _collect_tests before the records layer
+    for resource_name, test_id, resource_type, _ in _named_tests(allocator, tests):
+        existing_tests.setdefault((alias, aid), []).append([resource_name, test_id, resource_type])
+
+
+def allocate_only(existing_tests: dict, allocator: NameAllocator, alias: str, aid, tests):
+
+    # Baseline: the names (and the test ids the allocator keeps as keys), without any layout
+    for _ in _named_tests(allocator, tests):
+        pass
+
+
+def measure(org: MockOrg, collect) -> dict:
+
+    """Memory that stays after collecting every account group page with collect."""
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    allocator = NameAllocator("test")
+    existing_tests = {}
+    seconds = 0.0
+
+    for account in org.account_groups:
+
+        aid = account["aid"]
+        tests = org.tests(aid)
+
+        start = time.perf_counter()
+        collect(existing_tests, allocator, f'ag_{aid}', aid, tests)
+        seconds += time.perf_counter() - start
+
+        del tests
+
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    rows = sum(1 for _ in iter_tests(existing_tests))
+    iterate = time.perf_counter() - start
+
+    return {"tests": rows, "bytes": retained, "collect_s": seconds, "iterate_s": iterate, "result": existing_tests}
+
+
+if __name__ == "__main__":
+
+    account_groups = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    tests = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    org = MockOrg(account_groups=account_groups, tests=tests)
+
+    allocator = measure(org, allocate_only)
+    legacy = measure(org, legacy_collect)
+    records = measure(org, _collect_tests)
+
+    for result in (legacy, records):
+        result["bytes"] -= allocator["bytes"]
+
+    same = list(iter_tests(legacy["result"])) == list(iter_tests(records["result"]))
+
+    print(f'{legacy["tests"]} tests in {account_groups} account groups (same imports: {same})')
+    print(f'{"layout":22} {"MB":>8} {"bytes/test":>11} {"collect s":>10} {"iterate s":>10}')
+
+    for name, result in (("lists + tuple keys", legacy), ("AccountGroup/TestTable", records)):
+        print(
+            f'{name:22} {result["bytes"] / 1048576:8.2f} {result["bytes"] / max(1, result["tests"]):11.1f} '
+            f'{result["collect_s"]:10.3f} {result["iterate_s"]:10.3f}'
+        )
+
+    print(f'{"":22} {legacy["bytes"] / max(1, records["bytes"]):7.1f}x less memory, NameAllocator (both) {allocator["bytes"] / 1048576:.2f} MB')
@@ -0,0 +1,104 @@
+"""
+Startup budget of the entry points, measured with python -X importtime in a fresh interpreter.
+
+    python benchmarks/bench_startup.py [runs]
+
+Every module is imported runs times (default 5) and the fastest cumulative import time is compared
+with its budget. It also checks that nothing heavy is created at import time: httpx and its clients, the
+connector engine loop, the response cache and the modules only needed once an export starts. Exits with 1 when a budget or a
+check fails, so it can run as a CI step (the repo has no test suite, this script is the startup check).
+
+The config (pydantic, dotenv), colorama and the log handlers are still loaded at import, the entry points
+read them on startup.
+"""
+
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+if __package__ is None:
+    sys.path.append(str(ROOT))
+
+# Cumulative import time budget in milliseconds
+BUDGETS_MS = {
+    "main": 60,
+    "services.interactive_prompt": 400,
+    "helpers.list_tests": 400,
+    "helpers.list_agents": 400,
+}
+
+# Modules that must not be loaded just by importing the entry points
+DEFERRED_MODULES = ("httpx", "tqdm", "hcl2", "controller.create_terraform", "controller.shard_terraform", "services.pipeline_service")
+
+LAZY_CHECK = """
+import sys, json, importlib
+importlib.import_module(sys.argv[1])
+connector = sys.modules.get('services.connector_service')
+print(json.dumps({
+    'loaded': [name for name in sys.argv[2:] if name in sys.modules],
+    'clients': bool(connector and (connector.ConnectorSingleton._instance or connector.AsyncConnectorSingleton._instance or connector.engine.loop)),
+    'cache': bool(connector and connector._response_cache_ready),
+}))
+"""
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": str(ROOT)})
+
+
+def import_time_ms(module: str) -> float:
+
+    """Cumulative import time of the module, from the -X importtime report (microseconds) on stderr."""
+
+    result = run_python("-X", "importtime", "-c", f"import {module}")
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].rstrip() == f" {module}":
+            return int(parts[1]) / 1000
+
+    raise RuntimeError(f"{module} not found in the importtime report")
+
+
+def lazy_check(module: str) -> list:
+
+    """Problems found after importing the module (heavy modules loaded, clients or cache created)."""
+
+    result = run_python("-c", LAZY_CHECK, module, *DEFERRED_MODULES)
+    if result.returncode:
+        return [f"import failed: {result.stderr.strip().splitlines()[-1]}"]
+
+    state = json.loads(result.stdout)
+    problems = [f"{name} imported" for name in state["loaded"]]
+    if state["clients"]:
+        problems.append("httpx client created")
+    if state["cache"]:
+        problems.append("response cache opened")
+
+    return problems
+
+
+if __name__ == "__main__":
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    failed = False
+
+    for module, budget in BUDGETS_MS.items():
+
+        best = min(import_time_ms(module) for _ in range(runs))
+        problems = lazy_check(module)
+        ok = best <= budget and not problems
+        failed = failed or not ok
+
+        print(f'{module:30} {best:8.1f}ms  budget {budget:4d}ms  {"ok" if ok else "FAIL"}')
+        for problem in problems:
+            print(f'  - {problem}')
+
+    sys.exit(1 if failed else 0)
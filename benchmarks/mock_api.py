@@ -0,0 +1,453 @@
+"""
+Local stand-in of the ThousandEyes v7 API for the benchmarks (stdlib, no network access needed).
+
+    python benchmarks/mock_api.py --account-groups 20 --tests 500 --page-size 100 --latency 0.05
+
+Serves /v7/account-groups, /v7/tests, /v7/tests/{type}/{id} and /v7/agents with a deterministic org of
+the requested size, paginated through _links.next, with a per request latency and the x-organization-rate-limit-* headers
+of a fixed window quota. A 429 with Retry-After is returned when the quota is exhausted, and bursts
+of 429 can be injected every N requests to exercise the retry policy and the rate limit governor.
+With --http2-port the same org is also served over cleartext HTTP/2 (the only part that needs h2).
+"""
+
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+try:
+    from h2.config import H2Configuration
+    from h2.connection import H2Connection
+    from h2.events import RequestReceived, DataReceived, WindowUpdated, StreamReset, ConnectionTerminated
+    from h2.exceptions import ProtocolError
+except ImportError:
+    # Solo el mock HTTP/2 necesita h2 (optional, httpx[http2])
+    H2Connection = None
+
+TEST_TYPES = ("http-server", "page-load", "agent-to-server", "dns-server", "bgp", "web-transactions", "api")
+ORG_NAME = "Benchmark Org"
+
+
+class MockOrg:
+
+    """Deterministic account groups, tests and agents of a synthetic org."""
+
+    def __init__(self, account_groups: int = 10, tests: int = 200, agents: int = 50, duplicate_names: float = 0.2):
+
+        self.account_groups = [{"accountGroupName": f"Account Group {i}", "aid": str(1000 + i), "organizationName": ORG_NAME} for i in range(account_groups)]
+        self.tests_per_group = tests
+        self.agents_per_group = agents
+        self.duplicate_names = duplicate_names
+
+    def tests(self, aid: str) -> list:
+
+        rng = random.Random(aid)
+        base = int(aid) * 100000
+
+        return [
+            {
+                "testId": str(base + i),
+                "testName": "HTTP check" if rng.random() < self.duplicate_names else f"Test {i} - {aid} / prod",
+                "type": TEST_TYPES[i % len(TEST_TYPES)],
+                "interval": 300,
+                "enabled": True,
+                "createdDate": "2024-01-01T00:00:00Z",
+                "modifiedDate": "2024-06-01T00:00:00Z",
+            }
+            for i in range(self.tests_per_group)
+        ]
+
+    def test_detail(self, aid: str, test: dict) -> dict:
+
+        """/tests/{type}/{id} answer: the list entry plus the target, agents and alerting settings."""
+
+        agents = self.agents(aid)[:3]
+        return {
+            **test,
+            "url": f"https://app{int(test['testId']) % 97}.example.com/health",
+            "protocol": "TCP",
+            "networkMeasurements": True,
+            "bgpMeasurements": False,
+            "alertsEnabled": True,
+            "description": f"Synthetic test {test['testId']}",
+            "agents": [{"agentId": agent["agentId"], "agentName": agent["agentName"]} for agent in agents],
+            "_links": {"self": {"href": f"/v7/tests/{test['type']}/{test['testId']}"}},
+        }
+
+    def agents(self, aid: str) -> list:
+
+        # Enterprise agents are shared between account groups, the same agentId shows up in every group
+        return [
+            {
+                "agentId": str(500 + i),
+                "agentName": f"agent-{i:04d}",
+                "agentType": "enterprise-cluster" if i % 10 == 0 else "enterprise",
+                "location": f"Site {i % 25}",
+                "countryId": "US",
+                "enabled": True,
+            }
+            for i in range(self.agents_per_group)
+        ]
+
+
+class MockAPIServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+    # With the default backlog (5) a burst of new connections loses SYNs that are only retried after 1s
+    request_queue_size = 128
+
+    def __init__(self, address, org: MockOrg, page_size: int = 100, latency: float = 0.0, jitter: float = 0.0,
+                 rate_limit: int = 0, rate_window: float = 60.0, burst_every: int = 0, burst_length: int = 1,
+                 burst_retry_after: float = 0.5):
+
+        super().__init__(address, MockAPIHandler)
+
+        self.org = org
+        self.page_size = max(1, page_size)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.burst_retry_after = burst_retry_after
+
+        self._lock = threading.Lock()
+        self._window_end = 0.0
+        self._window_used = 0
+        self._pages = {}
+        self.requests = 0
+        self.throttled = 0
+        self.connections = 0
+
+    @property
+    def url(self) -> str:
+
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v7/"
+
+    def admit(self) -> tuple:
+
+        """Count the request against the quota, (status, headers) with status 429 when it is rejected."""
+
+        with self._lock:
+
+            self.requests += 1
+            now = time.time()
+
+            if now >= self._window_end:
+                self._window_end = now + self.rate_window
+                self._window_used = 0
+
+            self._window_used += 1
+            headers = {}
+
+            if self.rate_limit:
+                headers = {
+                    "x-organization-rate-limit-limit": str(self.rate_limit),
+                    "x-organization-rate-limit-remaining": str(max(0, self.rate_limit - self._window_used)),
+                    "x-organization-rate-limit-reset": f"{self._window_end:.3f}",
+                }
+                if self._window_used > self.rate_limit:
+                    self.throttled += 1
+                    headers["retry-after"] = f"{max(0.0, self._window_end - now):.3f}"
+                    return 429, headers
+
+            if self.burst_every and self.requests % self.burst_every < self.burst_length:
+                self.throttled += 1
+                headers["retry-after"] = f"{self.burst_retry_after:.3f}"
+                return 429, headers
+
+            return 200, headers
+
+    def items(self, kind: str, aid: str) -> list:
+
+        # Las paginas se generan una vez por account group
+        key = (kind, aid)
+        with self._lock:
+            if key not in self._pages:
+                self._pages[key] = self.org.tests(aid) if kind == "tests" else self.org.agents(aid)
+            return self._pages[key]
+
+    def delay(self) -> float:
+
+        return self.latency + random.uniform(0, self.jitter) if self.latency or self.jitter else 0.0
+
+    def respond(self, target: str, base_url: str | None = None) -> tuple:
+
+        """(status, body, headers) of a GET of target (path and query), shared by the HTTP/1.1 and HTTP/2 servers."""
+
+        base_url = base_url or self.url
+
+        status, headers = self.admit()
+        if status != 200:
+            return status, {"message": "Too Many Requests"}, headers
+
+        parts = urlsplit(target)
+        path = parts.path.rstrip("/")
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+        if path == "/v7/account-groups":
+            return 200, {"accountGroups": self.org.account_groups}, headers
+
+        if path.startswith("/v7/tests/") and path.count("/") == 4:
+
+            _, _, _, test_type, test_id = path.split("/")
+            aid = query.get("aid", self.org.account_groups[0]["aid"])
+            tests = self.items("tests", aid)
+            # MockOrg.tests numbers the tests from aid * 100000
+            index = int(test_id) - int(aid) * 100000 if test_id.isdigit() else -1
+            test = tests[index] if 0 <= index < len(tests) else None
+
+            if test is None or test["type"] != test_type:
+                return 404, {"message": f"Test {test_id} not found"}, headers
+
+            return 200, self.org.test_detail(aid, test), headers
+
+        if path in ("/v7/tests", "/v7/agents"):
+
+            kind = path.rsplit("/", 1)[1]
+            items = self.items(kind, query.get("aid", self.org.account_groups[0]["aid"]))
+            cursor = int(query.get("cursor", 0))
+            body = {kind: items[cursor:cursor + self.page_size], "_links": {"self": {"href": f"{base_url}{kind}"}}}
+
+            if cursor + self.page_size < len(items):
+                next_query = urlencode({**query, "cursor": cursor + self.page_size})
+                body["_links"]["next"] = {"href": f"{base_url}{kind}?{next_query}"}
+
+            return 200, body, headers
+
+        return 404, {"message": f"Unknown endpoint {path}"}, headers
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go in separate writes, with Nagle every response would wait for the delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+
+        pass
+
+    def setup(self):
+
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+
+    def send_json(self, status: int, body, headers: dict) -> None:
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+
+        delay = self.server.delay()
+        if delay:
+            time.sleep(delay)
+
+        self.send_json(*self.server.respond(self.path))
+
+
+class MockH2Protocol(asyncio.Protocol):
+
+    """One HTTP/2 (h2c, prior knowledge) connection, every stream is answered by its own task."""
+
+    def __init__(self, api: MockAPIServer, url: str):
+
+        self.api = api
+        self.url = url
+        self.conn = H2Connection(config=H2Configuration(client_side=False, header_encoding="utf-8"))
+        self.transport = None
+        self.window_open = {}
+
+    def connection_made(self, transport):
+
+        self.transport = transport
+        with self.api._lock:
+            self.api.connections += 1
+
+        self.conn.initiate_connection()
+        transport.write(self.conn.data_to_send())
+
+    def data_received(self, data: bytes):
+
+        try:
+            events = self.conn.receive_data(data)
+        except ProtocolError:
+            self.transport.write(self.conn.data_to_send())
+            self.transport.close()
+            return
+
+        for event in events:
+
+            if isinstance(event, RequestReceived):
+                headers = dict(event.headers)
+                asyncio.get_running_loop().create_task(self.answer(event.stream_id, headers.get(":path", "/")))
+
+            elif isinstance(event, DataReceived):
+                self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+
+            elif isinstance(event, WindowUpdated):
+                # stream_id 0 es la ventana de la conexion, despierta a todos los streams
+                for stream_id, opened in self.window_open.items():
+                    if event.stream_id in (0, stream_id):
+                        opened.set()
+
+            elif isinstance(event, (StreamReset, ConnectionTerminated)):
+                for opened in self.window_open.values():
+                    opened.set()
+
+        self.transport.write(self.conn.data_to_send())
+
+    def connection_lost(self, exc):
+
+        for opened in self.window_open.values():
+            opened.set()
+
+    async def answer(self, stream_id: int, target: str) -> None:
+
+        delay = self.api.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+        status, body, headers = self.api.respond(target, self.url)
+        payload = json.dumps(body).encode()
+
+        try:
+            self.conn.send_headers(stream_id, [
+                (":status", str(status)),
+                ("content-type", "application/json"),
+                ("content-length", str(len(payload))),
+                *headers.items(),
+            ])
+
+            # Respect the flow control windows, a frame is never bigger than what the client accepts
+            while payload:
+
+                window = min(self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size)
+
+                if window <= 0:
+                    opened = self.window_open.setdefault(stream_id, asyncio.Event())
+                    opened.clear()
+                    self.transport.write(self.conn.data_to_send())
+                    await opened.wait()
+                    if self.transport.is_closing():
+                        return
+                    continue
+
+                chunk, payload = payload[:window], payload[window:]
+                self.conn.send_data(stream_id, chunk)
+
+            self.conn.end_stream(stream_id)
+
+        except (ProtocolError, KeyError):
+            # The client reset the stream or closed the connection meanwhile
+            pass
+
+        finally:
+            self.window_open.pop(stream_id, None)
+
+        if not self.transport.is_closing():
+            self.transport.write(self.conn.data_to_send())
+
+
+def start_mock_h2_api(api: MockAPIServer, host: str = "127.0.0.1", port: int = 0) -> str:
+
+    """
+    Serve the same mock over cleartext HTTP/2 (needs the h2 package), returns its base URL.
+
+    The requests, 429 quota and connections are counted on api, so both protocols can be compared on
+    the same org. The client has to speak HTTP/2 from the start (httpx: http2=True, http1=False).
+    """
+
+    if H2Connection is None:
+        raise RuntimeError('the HTTP/2 mock needs the h2 package (pip install "httpx[http2]")')
+
+    sock = socket.create_server((host, port), backlog=128)
+    bound_host, bound_port = sock.getsockname()[:2]
+    url = f"http://{bound_host}:{bound_port}/v7/"
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(loop.create_server(lambda: MockH2Protocol(api, url), sock=sock))
+    threading.Thread(target=loop.run_forever, name="mock-api-h2", daemon=True).start()
+
+    return url
+
+
+def start_mock_api(host: str = "127.0.0.1", port: int = 0, **options) -> MockAPIServer:
+
+    """Start the mock API in a daemon thread (port 0 = any free port), server.url is the base URL to use."""
+
+    org = MockOrg(**{key: options.pop(key) for key in ("account_groups", "tests", "agents", "duplicate_names") if key in options})
+    server = MockAPIServer((host, port), org, **options)
+    threading.Thread(target=server.serve_forever, name="mock-api", daemon=True).start()
+
+    return server
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+
+    parser.add_argument("--account-groups", type=int, default=10)
+    parser.add_argument("--tests", type=int, default=200, help="tests per account group")
+    parser.add_argument("--agents", type=int, default=50, help="agents per account group")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, up to this many seconds")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per window, 0 = no quota headers")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="seconds of the rate limit window")
+    parser.add_argument("--burst-every", type=int, default=0, help="inject a 429 burst every N requests")
+    parser.add_argument("--burst-length", type=int, default=1, help="429 responses per burst")
+
+
+def mock_options(args) -> dict:
+
+    return {
+        "account_groups": args.account_groups,
+        "tests": args.tests,
+        "agents": args.agents,
+        "page_size": args.page_size,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "rate_limit": args.rate_limit,
+        "rate_window": args.rate_window,
+        "burst_every": args.burst_every,
+        "burst_length": args.burst_length,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--http2-port", type=int, help="also serve the org over HTTP/2 (h2c) on this port, needs h2")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_mock_api(port=args.port, **mock_options(args))
+    print(f"Mock ThousandEyes API on {server.url} (TE_API_URL={server.url}, ORG_NAME='{ORG_NAME}')")
+
+    if args.http2_port is not None:
+        h2_url = start_mock_h2_api(server, port=args.http2_port)
+        print(f"Same org over cleartext HTTP/2 on {h2_url} (TE_API_URL={h2_url}, HTTP2=true)")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 
@@ -17,5 +18,80 @@ class Config(BaseModel):
     terraform_project_path: str = Field(default=os.getenv("TERRAFORM_PROJECT_PATH", ""))
     te_tf_version:str = Field(default=os.getenv("TE_TF_VERSION",""))
 
+    # Base URL of the ThousandEyes API (e.g. a local stand-in for the benchmarks)
+    api_url: str = Field(default=os.getenv("TE_API_URL", "https://api.thousandeyes.com/v7/"))
 
-config = Config()
\ No newline at end of file
+    # Connection pool of the HTTP clients (sync and async share the settings, every request goes to the same host)
+    http_max_connections: int = Field(default=int(os.getenv("HTTP_MAX_CONNECTIONS", 100)))
+    http_max_keepalive: int = Field(default=int(os.getenv("HTTP_MAX_KEEPALIVE", 100)))
+    http_keepalive_expiry: float = Field(default=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 50.0)))
+    http_connect_timeout: float = Field(default=float(os.getenv("HTTP_CONNECT_TIMEOUT", 17.7)))
+    http_pool_timeout: float = Field(default=float(os.getenv("HTTP_POOL_TIMEOUT", 7.7)))
+
+    # HTTP/2 multiplexing (needs the optional h2 package: pip install "httpx[http2]")
+    http2: bool = Field(default=os.getenv("HTTP2", "false").lower() in ("1", "true", "yes"))
+
+    # Concurrent fetch of the account groups tests
+    async_fetch: bool = Field(default=os.getenv("ASYNC_FETCH", "true").lower() in ("1", "true", "yes"))
+    fetch_concurrency: int = Field(default=int(os.getenv("FETCH_CONCURRENCY", 10)))
+
+    # Overlap fetching, naming and writing the import blocks (account groups held in memory per stage)
+    export_pipeline: bool = Field(default=os.getenv("EXPORT_PIPELINE", "true").lower() in ("1", "true", "yes"))
+    pipeline_queue_size: int = Field(default=int(os.getenv("PIPELINE_QUEUE_SIZE", 20)))
+
+    # Org-wide rate limit (requests per minute) and permits kept as a safety margin
+    rate_limit: int = Field(default=int(os.getenv("RATE_LIMIT", 240)))
+    rate_limit_reserve: int = Field(default=int(os.getenv("RATE_LIMIT_RESERVE", 2)))
+
+    # Retry policy of the connector (attempts include the first request, backoff in seconds)
+    retry_max_attempts: int = Field(default=int(os.getenv("RETRY_MAX_ATTEMPTS", 5)))
+    retry_backoff_base: float = Field(default=float(os.getenv("RETRY_BACKOFF_BASE", 1.0)))
+    retry_backoff_max: float = Field(default=float(os.getenv("RETRY_BACKOFF_MAX", 30.0)))
+
+    # On-disk response cache, TTLs (seconds) per endpoint, endpoints not listed are never cached
+    http_cache: bool = Field(default=os.getenv("HTTP_CACHE", "true").lower() in ("1", "true", "yes"))
+    http_cache_dir: str = Field(default=os.getenv("HTTP_CACHE_DIR", ".cache"))
+    http_cache_max_mb: int = Field(default=int(os.getenv("HTTP_CACHE_MAX_MB", 64)))
+    http_cache_ttls: dict = Field(default=json.loads(os.getenv("HTTP_CACHE_TTLS", '{"account-groups": 3600, "tests": 300, "agents": 300}')))
+
+    # Full resource blocks from the test details (/tests/{type}/{id}), requests in flight while hydrating
+    export_resources: bool = Field(default=os.getenv("EXPORT_RESOURCES", "false").lower() in ("1", "true", "yes"))
+    hydrate_window: int = Field(default=int(os.getenv("HYDRATE_WINDOW", 50)))
+
+    # Seconds the account groups list is reused within a process before it is fetched again
+    account_groups_refresh: int = Field(default=int(os.getenv("ACCOUNT_GROUPS_REFRESH", 900)))
+
+    # Terraform files generation: write buffer (characters) and temp file + rename output
+    tf_write_buffer: int = Field(default=int(os.getenv("TF_WRITE_BUFFER", 1 << 20)))
+    tf_atomic_write: bool = Field(default=os.getenv("TF_ATOMIC_WRITE", "false").lower() in ("1", "true", "yes"))
+
+    # Only append the providers and imports that are not in the Terraform project yet
+    incremental_imports: bool = Field(default=os.getenv("INCREMENTAL_IMPORTS", "true").lower() in ("1", "true", "yes"))
+
+    # Cache of the parsed Terraform files used by update_terraform
+    tf_parse_cache_dir: str = Field(default=os.getenv("TF_PARSE_CACHE_DIR", os.path.join(os.getenv("HTTP_CACHE_DIR", ".cache"), "tf_parse")))
+
+    # One Terraform root module per account group alias instead of single imports.tf / main.tf files
+    tf_sharded: bool = Field(default=os.getenv("TF_SHARDED", "false").lower() in ("1", "true", "yes"))
+
+    # Names given to the tests, kept in the Terraform project so they do not change between runs ("" disables it)
+    names_state_file: str = Field(default=os.getenv("NAMES_STATE_FILE", ".te_names.json"))
+
+    # Rotation of the log files (app.log, api_calls.log), the multi-org runner gives every org its own log dir
+    log_dir: str = Field(default=os.getenv("LOG_DIR", "./logs"))
+    log_max_bytes: int = Field(default=int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024)))
+    log_backup_count: int = Field(default=int(os.getenv("LOG_BACKUP_COUNT", 5)))
+
+    # Connector metrics written at the end of a run, Prometheus text for *.prom, JSON otherwise ("" disables it)
+    metrics_file: str = Field(default=os.getenv("METRICS_FILE", ""))
+
+    # Profiling of the export phases: time, cprofile and / or tracemalloc, comma separated ("" disables it)
+    profile: str = Field(default=os.getenv("PROFILE", ""))
+    profile_report: str = Field(default=os.getenv("PROFILE_REPORT", "profile_report.txt"))
+
+    # Multi-org export: JSON file listing the orgs (tokens, output paths) and orgs exported at once (processes)
+    orgs_file: str = Field(default=os.getenv("ORGS_FILE", "orgs.json"))
+    org_workers: int = Field(default=int(os.getenv("ORG_WORKERS", min(4, os.cpu_count() or 1))))
+
+
+config = Config()
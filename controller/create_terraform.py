@@ -1,73 +1,380 @@
 from services.logging_service import my_logger
-from tqdm import tqdm
+from services.profiling_service import profiled_phase
 from config.configuration import config
+from controller.hcl_renderer import render_block
 import os
+import re
+import sys
+import time
+import shutil
+import tempfile
 
 
+TOKEN_VARIABLE_RE = re.compile(r'variable\s+"token"\s*\{')
+TE_SOURCE_RE = re.compile(r'source\s*=\s*"thousandeyes/thousandeyes"')
+PROVIDER_ALIAS_RE = re.compile(r'provider\s+"thousandeyes"\s*\{[^}]*?alias\s*=\s*"([^"]+)"', re.S)
+IMPORT_RE = re.compile(r'import\s*\{([^}]*)\}', re.S)
+IMPORT_ATTR_RE = re.compile(r'^\s*(provider|to|id)\s*=\s*"?([^"\s]+)"?', re.M)
+CAMEL_CASE_RE = re.compile(r'(?<!^)(?=[A-Z])')
 
-def create_import_terraform(existing_tests:dict) -> bool:
+# Fields of the test details that are computed by ThousandEyes and can not be part of a resource
+READ_ONLY_FIELDS = {
+    'testId', 'type', 'createdBy', 'createdDate', 'modifiedBy', 'modifiedDate', 'savedEvent', 'liveShare',
+    '_links', 'links', 'apiLinks', 'sharedWithAccounts', 'labels', 'accountGroupName',
+}
 
-    
-    # Set the path to the existing terraform project
-    file_path = os.path.join(os.getcwd(), config.terraform_project_path)
 
-    import_file = os.path.join(file_path, "imports.tf")
-    providers_file = os.path.join(file_path, "providers.tf")
-    vars_file = os.path.join(file_path, "variables.tf")
-    
-    # Parse existing providers to avoid duplicates
-    with open(vars_file, 'a') as vars_file:
-        
-        token_var_str = 'variable "token" {\n'
-        token_var_str += f'    description = "ThousandEyes API Token"\n'
-        token_var_str += f'    type        = string\n'
-        token_var_str += f'    default = "{config.API_TOKEN}"\n'
-        token_var_str += '}\n\n'
+class TerraformFileWriter:
+
+    """
+    Buffered writer for the generated .tf files.
+
+    The blocks are kept in memory and written in chunks of buffer_size characters. With atomic=True the
+    content goes to a temp file in the same directory that replaces the target only when the writer is
+    closed without errors (append mode copies the current file first), so a failed export never leaves
+    a half written file behind.
+    """
+
+    def __init__(self, path: str, mode: str = 'a', atomic: bool = False, buffer_size: int = 1 << 20):
+
+        self.path = path
+        self.mode = mode
+        self.atomic = atomic
+        self.buffer_size = buffer_size
+        self._chunks = []
+        self._size = 0
+        self._tmp_path = None
+        self._file = None
+
+    def __enter__(self):
+
+        if self.atomic:
+
+            fd, self._tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(self.path)}.', dir=os.path.dirname(self.path) or '.')
+            os.close(fd)
+
+            if os.path.exists(self.path):
+                shutil.copymode(self.path, self._tmp_path)
+                if self.mode == 'a':
+                    shutil.copyfile(self.path, self._tmp_path)
+            else:
+                # mkstemp creates the file as 0600, use the permissions a plain open() would give
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(self._tmp_path, 0o666 & ~umask)
+
+            self._file = open(self._tmp_path, 'a')
+
+        else:
+            self._file = open(self.path, self.mode)
+
+        return self
+
+    def write(self, text: str) -> None:
+
+        self._chunks.append(text)
+        self._size += len(text)
+
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+
+        if self._chunks:
+            self._file.write(''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+
+    def __exit__(self, exc_type, exc, tb):
+
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            self._file.close()
+
+        if self._tmp_path:
+            if exc_type is None:
+                os.replace(self._tmp_path, self.path)
+            else:
+                os.remove(self._tmp_path)
+
+        return False
+
+
+class TerraformProjectIndex:
+
+    """What the Terraform project already declares: token variable, terraform block, provider aliases and imports."""
+
+    def __init__(self):
+
+        self.has_token_variable = False
+        self.has_terraform_block = False
+        self.provider_aliases: set[str] = set()
+        self.import_targets: set[str] = set()
+        self.import_ids: set[tuple[str, str]] = set()
+
+    def add_import(self, alias: str, target: str, test_id) -> None:
+
+        self.import_targets.add(target)
+        self.import_ids.add((alias, str(test_id)))
+
+    def has_import(self, alias: str, test_id) -> bool:
+
+        """A test is imported when its provider alias + id is, the target alone can belong to another test."""
+
+        return (alias, str(test_id)) in self.import_ids
+
+
+def index_terraform_project(file_path: str) -> TerraformProjectIndex:
+
+    """Scan the .tf files of the project (regex scan, no full HCL parse) and index what they declare."""
+
+    index = TerraformProjectIndex()
+
+    if not os.path.isdir(file_path):
+        return index
+
+    for entry in os.scandir(file_path):
+
+        if not entry.is_file() or not entry.name.endswith('.tf'):
+            continue
+
+        with open(entry.path, 'r') as tf_file:
+            content = tf_file.read()
+
+        index.has_token_variable = index.has_token_variable or bool(TOKEN_VARIABLE_RE.search(content))
+        index.has_terraform_block = index.has_terraform_block or bool(TE_SOURCE_RE.search(content))
+        index.provider_aliases.update(PROVIDER_ALIAS_RE.findall(content))
+
+        for body in IMPORT_RE.findall(content):
+
+            attrs = dict(IMPORT_ATTR_RE.findall(body))
+            alias = attrs.get('provider', '').removeprefix('thousandeyes.')
+
+            if 'to' in attrs:
+                index.import_targets.add(attrs['to'])
+            if 'id' in attrs:
+                index.import_ids.add((alias, attrs['id']))
+
+    return index
+
+
+def token_variable_block() -> str:
+
+    return (
+        'variable "token" {\n'
+        '    description = "ThousandEyes API Token"\n'
+        '    type        = string\n'
+        f'    default = "{config.API_TOKEN}"\n'
+        '}\n\n'
+    )
+
+
+def terraform_block() -> str:
+
+    return (
+        'terraform {\n  required_providers {\n    thousandeyes = {\n'
+        f'      source  = "thousandeyes/thousandeyes"\n      version = "{config.te_tf_version}"\n'
+        '    }\n  }\n} \n\n'
+    )
+
+
+def provider_block(alias: str, aid) -> str:
+
+    return (
+        'provider "thousandeyes" {\n'
+        f'  alias = "{alias}"\n'
+        '  token = var.token\n'
+        f'  account_group_id = "{aid}"\n'
+        '}\n\n'
+    )
 
 
-        vars_file.write(token_var_str)
+def import_block(alias: str, test_name: str, test_id, resource_type: str) -> str:
 
+    # to = thousandeyes_http_server.AHCTesting
+    return f'import {{ \n  provider = thousandeyes.{alias}\n  to = {resource_type}.{test_name}\n  id = {test_id}\n}}\n\n'
 
-    # Parse existing providers to avoid duplicates
-    with open(providers_file, 'a') as prov_file:
 
-        
-        terraform_str = 'terraform {\n  required_providers {\n    thousandeyes = {\n'
-        terraform_str += f'      source  = "thousandeyes/thousandeyes"\n      version = "{config.te_tf_version}"'
-        terraform_str += '    }\n  }\n} \n\n'
+def resource_body(alias: str, detail: dict) -> dict:
 
-        prov_file.write(terraform_str)
+    """Resource arguments from the details of a test, same shape as generate_resource_block in update_terraform."""
 
-        for account in existing_tests.keys():
+    body = {}
 
-            prov_file.write('provider "thousandeyes" {\n')
-            prov_file.write(f'  alias = "{account[0]}"\n')
-            prov_file.write(f'  token = var.token\n')
-            prov_file.write(f'  account_group_id = "{account[1]}"\n')
-            prov_file.write('}\n\n')
+    for key, value in detail.items():
 
-    # Open the import file in append mode
-    with open(import_file, 'a') as tf_file:
+        if key in READ_ONLY_FIELDS or value is None:
+            continue
 
-        for account_group, tests in tqdm(existing_tests.items(), desc="Generating Terraform File", unit=" account groups"):
+        if key == 'agents':
+            value = [{'agent_id': agent['agentId']} for agent in value if isinstance(agent, dict) and 'agentId' in agent]
+            if not value:
+                continue
 
-            ag_name = account_group[0]
+        body[CAMEL_CASE_RE.sub('_', key).lower()] = value
+
+    # render_string escribe "${...}" como expresion: provider = thousandeyes.alias
+    body['provider'] = f'${{thousandeyes.{alias}}}'
+
+    return body
+
+
+def resource_block(alias: str, test_name: str, resource_type: str, detail: dict) -> str:
+
+    return render_block('resource', (resource_type, test_name), resource_body(alias, detail))
+
+
+def iter_tests(existing_tests: dict):
+
+    """Flatten the get_existant_tests dict ({AccountGroup: TestTable}) into (alias, aid, test_name, test_id, resource_type) tuples."""
+
+    for (alias, aid), tests in existing_tests.items():
+        for test_name, test_id, resource_type in tests:
+            yield alias, aid, test_name, test_id, resource_type
+
+
+class ImportEmitter:
+
+    """
+    Push-style writer of the variables, providers and import blocks of a Terraform project.
+
+    A provider block is written the first time an account group alias shows up, so the tests never
+    need to be in memory at once. In incremental mode the blocks already declared in the project
+    (token variable, terraform block, provider aliases and imports by provider + id) are skipped, so
+    a re-sync only appends what changed. A new test whose target is already taken is written and logged.
+    """
+
+    def __init__(self, file_path: str, atomic: bool | None = None, incremental: bool | None = None):
+
+        self.file_path = file_path
+        self.atomic = config.tf_atomic_write if atomic is None else atomic
+        self.incremental = config.incremental_imports if incremental is None else incremental
+        self.index = index_terraform_project(file_path) if self.incremental else TerraformProjectIndex()
+        self.count = 0
+        self.skipped = 0
+        self._files = []
+
+    def __enter__(self):
+
+        buffer_size = config.tf_write_buffer
+        # --output puede apuntar a un directorio nuevo, igual que con --shard o --resources
+        os.makedirs(self.file_path, exist_ok=True)
+
+        try:
+            for name in ("variables.tf", "providers.tf", "imports.tf"):
+                writer = TerraformFileWriter(os.path.join(self.file_path, name), atomic=self.atomic, buffer_size=buffer_size)
+                self._files.append(writer.__enter__())
+        except BaseException:
+            self.__exit__(*sys.exc_info())
+            raise
+
+        self.vars_file, self.prov_file, self.tf_file = self._files
+
+        if not self.index.has_token_variable:
+            self.vars_file.write(token_variable_block())
+
+        if not self.index.has_terraform_block:
+            self.prov_file.write(terraform_block())
+
+        self.start = time.perf_counter()
+
+        return self
+
+    def emit(self, alias: str, aid, test_name: str, test_id, resource_type: str) -> None:
+
+        if alias not in self.index.provider_aliases:
+            self.index.provider_aliases.add(alias)
+            self.prov_file.write(provider_block(alias, aid))
+
+        target = f'{resource_type}.{test_name}'
+
+        if self.incremental and self.index.has_import(alias, test_id):
+            self.skipped += 1
+        else:
+            if target in self.index.import_targets:
+                # Otro test ya usa esa direccion (p.ej. se borro el names state), terraform va a rechazar el import duplicado
+                my_logger.warning(f'Import target {target} of test {test_id} ({alias}) is already used by another test in the project')
+            self.tf_file.write(import_block(alias, test_name, test_id, resource_type))
+            self.index.add_import(alias, target, test_id)
+            self.count += 1
+
+    @profiled_phase("write_batch")
+    def emit_batch(self, tests, flush: bool = True) -> None:
+
+        """Emit a batch of tests (e.g. one account group) and push it to disk right away."""
+
+        for test in tests:
+            self.emit(*test)
+
+        if flush:
+            self.flush()
+
+    def flush(self) -> None:
+
+        for writer in self._files:
+            writer.flush()
+
+    def __exit__(self, exc_type, exc, tb):
+
+        # Close in reverse order, every file is closed even if one of them fails
+        error = None
+        for writer in reversed(self._files):
+            try:
+                writer.__exit__(exc_type, exc, tb)
+            except Exception as e:
+                error = error or e
+
+        if error is not None and exc_type is None:
+            raise error
+
+        if exc_type is None:
+            elapsed = time.perf_counter() - self.start
+            processed = self.count + self.skipped
+            my_logger.info(f'{self.count} import blocks written, {self.skipped} already in the project, in {elapsed:.3f}s ({processed / elapsed if elapsed else 0:.0f} tests/s)')
+
+        return False
+
+
+def emit_terraform(tests, file_path: str, atomic: bool | None = None, total: int | None = None, incremental: bool | None = None, progress_bar: bool = True) -> int:
+
+    """Stream an iterator of (alias, aid, test_name, test_id, resource_type) tests to the project files, returns the import blocks written."""
+
+    from tqdm import tqdm
+
+    with ImportEmitter(file_path, atomic=atomic, incremental=incremental) as emitter:
+
+        with tqdm(total=total, desc="Generating Terraform File", unit=" tests", disable=not progress_bar) as progress:
+
+            processed = 0
 
             for test in tests:
 
-                test_name = test[0]
-                test_id = test[1]
-                resource_type = test[2]
+                emitter.emit(*test)
+                processed += 1
+
+                # The progress bar is updated in batches to keep it out of the per test cost
+                if not processed % 1024:
+                    progress.update(1024)
+
+            progress.update(processed % 1024)
 
-                terraform_str = 'import { \n'
-                terraform_str += f'  provider = thousandeyes.{ag_name}\n'
-                terraform_str += f'  to = {resource_type}.{test_name}\n' # to = thousandeyes_http_server.AHCTesting
-                terraform_str += f'  id = {test_id}\n'
+    return emitter.count
+
+
+@profiled_phase("create_import_terraform")
+def create_import_terraform(existing_tests:dict) -> int:
+
+    """Write the import blocks of the get_existant_tests dict, returns the blocks written (incremental mode skips the known ones)."""
+
+    # Set the path to the existing terraform project
+    file_path = os.path.join(os.getcwd(), config.terraform_project_path)
 
-                terraform_str += "}\n\n"
-                tf_file.write(terraform_str)
+    total = sum(len(tests) for tests in existing_tests.values())
+    written = emit_terraform(iter_tests(existing_tests), file_path, total=total)
 
     print(f'Terraform configuration updated: {file_path}')
     my_logger.info(f'Terraform configuration updated at {file_path}')
 
-    return True
+    return written
@@ -0,0 +1,141 @@
+import re
+from functools import lru_cache
+
+# Keys that can be written without quotes
+IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_-]*$')
+# A value that is a whole expression, as returned by hcl2 for references (e.g. "${thousandeyes.sw_team}")
+EXPRESSION_RE = re.compile(r'^\$\{([^{}]*)\}$')
+# Characters that need escaping (most values have none, so they skip translate)
+NEEDS_ESCAPE_RE = re.compile(r'[\\"\n\r\t]|%\{')
+
+ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '"': '\\"',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\t': '\\t',
+})
+
+INDENT = '  '
+
+
+def render_string(value: str) -> str:
+
+    """HCL string literal, a whole "${...}" expression is rendered bare (thousandeyes.alias, var.token)."""
+
+    if value.startswith('${'):
+        expression = EXPRESSION_RE.match(value)
+        if expression:
+            return expression.group(1)
+
+    if NEEDS_ESCAPE_RE.search(value) is None:
+        return f'"{value}"'
+
+    # %{ starts a template directive, interpolations (${...}) are kept as they are
+    return '"' + value.translate(ESCAPES).replace('%{', '%%{') + '"'
+
+
+@lru_cache(maxsize=4096)
+def render_key(key: str) -> str:
+
+    return key if IDENTIFIER_RE.match(key) else render_string(str(key))
+
+
+def render_value(value, level: int = 0) -> str:
+
+    """HCL expression of a python value: bool, None, numbers, strings, lists and dicts (objects)."""
+
+    if type(value) is str:
+        return render_string(value)
+
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+
+    if value is None:
+        return 'null'
+
+    if isinstance(value, (int, float)):
+        return repr(value)
+
+    if isinstance(value, str):
+        return render_string(value)
+
+    if isinstance(value, (list, tuple, set)):
+        return '[' + ', '.join(render_value(item, level) for item in value) + ']'
+
+    if isinstance(value, dict):
+
+        if not value:
+            return '{}'
+
+        inner = INDENT * (level + 1)
+        lines = [f'{inner}{render_key(str(k))} = {render_value(v, level + 1)}' for k, v in value.items()]
+        return '{\n' + '\n'.join(lines) + '\n' + INDENT * level + '}'
+
+    return render_string(str(value))
+
+
+def is_block_list(value) -> bool:
+
+    """hcl2 represents nested blocks (e.g. agents { ... }) as a list of dicts."""
+
+    return type(value) is list and bool(value) and all(type(item) is dict for item in value)
+
+
+def render_body(parts: list, body: dict, level: int) -> None:
+
+    indent = INDENT * level
+
+    for key, value in body.items():
+
+        value_type = type(value)
+
+        # Inlined fast paths for the common value types, everything else goes through render_value
+        if value_type is str:
+            rendered = render_string(value)
+        elif value_type is int or value_type is float:
+            rendered = repr(value)
+        elif value_type is bool:
+            rendered = 'true' if value else 'false'
+        elif is_block_list(value):
+            for block in value:
+                parts.append(f'{indent}{key} {{\n')
+                render_body(parts, block, level + 1)
+                parts.append(f'{indent}}}\n')
+            continue
+        else:
+            rendered = render_value(value, level)
+
+        parts.append(f'{indent}{render_key(key)} = {rendered}\n')
+
+
+def render_block(block_type: str, labels: tuple, body: dict) -> str:
+
+    """Top level block, e.g. render_block('resource', ('thousandeyes_http_server', 'x'), {...})."""
+
+    parts = [block_type]
+    parts.extend(f' "{label}"' for label in labels)
+    parts.append(' {\n')
+    render_body(parts, body, 1)
+    parts.append('}\n\n')
+
+    return ''.join(parts)
+
+
+def write_block(fh, block_type: str, labels: tuple, body: dict) -> None:
+
+    fh.write(render_block(block_type, labels, body))
+
+
+def write_terraform(fh, terraform_data: dict) -> None:
+
+    """Stream the providers and resources of a hcl2-style dict to an open file, one block at a time."""
+
+    for provider in terraform_data.get('provider', []):
+        for provider_name, provider_config in provider.items():
+            write_block(fh, 'provider', (provider_name,), provider_config)
+
+    for resource in terraform_data.get('resource', []):
+        for resource_type, resources in resource.items():
+            for resource_name, resource_config in resources.items():
+                write_block(fh, 'resource', (resource_type, resource_name), resource_config)
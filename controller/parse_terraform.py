@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import hcl2
+from config.configuration import config
+
+# Bump when the cached format changes so old entries are ignored
+PARSE_CACHE_VERSION = 1
+
+
+def _cache_file(file_path: str) -> str:
+
+    key = hashlib.sha256(os.path.abspath(file_path).encode()).hexdigest()
+    return os.path.join(config.tf_parse_cache_dir, f'{key}.json')
+
+
+def _read_cache(cache_file: str) -> dict | None:
+
+    try:
+        with open(cache_file, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    return cached if cached.get('version') == PARSE_CACHE_VERSION else None
+
+
+def _write_cache(cache_file: str, entry: dict) -> None:
+
+    """Write the cache entry through a temp file so parallel workers never read half of it."""
+
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, cache_file)
+    except (OSError, TypeError, ValueError):
+        # El cache es opcional: un valor que json no puede guardar solo deja el archivo sin cachear
+        pass
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def parse_terraform_file(file_path: str, use_cache: bool = True) -> dict:
+
+    """
+    hcl2 parse of a .tf file, cached on disk by path, mtime, size and content hash.
+
+    Same mtime and size -> the cached result is used without reading the file. Otherwise the content
+    hash is compared, so a touched but unchanged file still skips the lark parse.
+    """
+
+    if not use_cache:
+        with open(file_path, 'r') as tf_file:
+            return hcl2.loads(tf_file.read())
+
+    stat = os.stat(file_path)
+    cache_file = _cache_file(file_path)
+    cached = _read_cache(cache_file)
+
+    if cached and cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+        return cached['parsed']
+
+    with open(file_path, 'rb') as tf_file:
+        content = tf_file.read()
+
+    digest = hashlib.sha256(content).hexdigest()
+
+    if cached and cached['sha256'] == digest:
+        parsed = cached['parsed']
+    else:
+        parsed = hcl2.loads(content.decode())
+
+    _write_cache(cache_file, {
+        'version': PARSE_CACHE_VERSION,
+        'path': os.path.abspath(file_path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': digest,
+        'parsed': parsed,
+    })
+
+    return parsed
+
+
+def parse_terraform_files(paths: list, max_workers: int | None = None) -> dict:
+
+    """Parse many .tf files in a process pool (the lark parse is CPU bound), {path: parsed}."""
+
+    paths = list(paths)
+
+    if len(paths) <= 1 or max_workers == 1:
+        return {path: parse_terraform_file(path) for path in paths}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(paths, pool.map(parse_terraform_file, paths)))
+
+
+def parse_terraform_project(dir_path: str, max_workers: int | None = None) -> dict:
+
+    """Parse every .tf file of a Terraform project directory."""
+
+    paths = sorted(entry.path for entry in os.scandir(dir_path) if entry.is_file() and entry.name.endswith('.tf'))
+    return parse_terraform_files(paths, max_workers=max_workers)
@@ -0,0 +1,193 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from config.configuration import config
+from services.logging_service import my_logger
+from services.profiling_service import profiled_phase
+from controller.create_terraform import emit_terraform, iter_tests, TerraformFileWriter
+from controller.hcl_renderer import write_terraform
+
+MANIFEST_FILE = "shards.json"
+
+
+def file_digest(path: str) -> str | None:
+
+    if not os.path.exists(path):
+        return None
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(base_dir: str) -> dict:
+
+    try:
+        with open(os.path.join(base_dir, MANIFEST_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"shards": {}}
+
+
+def write_manifest(base_dir: str, shards: list) -> dict:
+
+    """Merge the shards of this run into shards.json, shards not touched in this run are kept."""
+
+    manifest = read_manifest(base_dir)
+    manifest.setdefault("shards", {})
+
+    for shard in shards:
+        manifest["shards"][shard["alias"]] = {**manifest["shards"].get(shard["alias"], {}), **shard}
+
+    manifest["generated_at"] = datetime.now(timezone.utc).isoformat()
+
+    with TerraformFileWriter(os.path.join(base_dir, MANIFEST_FILE), mode='w', atomic=True) as f:
+        f.write(json.dumps(manifest, indent=2, sort_keys=True))
+
+    return manifest
+
+
+def _emit_shard(base_dir: str, alias: str, aid, tests: list) -> dict:
+
+    shard_dir = os.path.join(base_dir, alias)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    written = emit_terraform(iter_tests({(alias, aid): tests}), shard_dir, total=len(tests), progress_bar=False)
+
+    return {
+        "alias": alias,
+        "aid": str(aid),
+        "path": alias,
+        "tests": len(tests),
+        "imports_written": written,
+        "imports_sha256": file_digest(os.path.join(shard_dir, "imports.tf")),
+    }
+
+
+@profiled_phase("create_sharded_terraform")
+def create_sharded_terraform(existing_tests: dict, base_dir: str | None = None, max_workers: int | None = None) -> dict:
+
+    """
+    One Terraform root module per account group: <project>/<alias>/{variables,providers,imports}.tf.
+
+    The shards are generated concurrently and indexed in <project>/shards.json so CI can plan and
+    apply only the account groups that changed.
+    """
+
+    if base_dir is None:
+        base_dir = os.path.join(os.getcwd(), config.terraform_project_path)
+
+    if max_workers is None:
+        max_workers = config.fetch_concurrency
+
+    os.makedirs(base_dir, exist_ok=True)
+    shards = []
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='shard') as pool:
+
+        futures = [pool.submit(_emit_shard, base_dir, alias, aid, tests) for (alias, aid), tests in existing_tests.items()]
+
+        for future in tqdm(futures, desc="Generating Terraform shards", unit=" account groups"):
+            shards.append(future.result())
+
+    manifest = write_manifest(base_dir, shards)
+
+    my_logger.info(f'{len(shards)} Terraform shards generated at {base_dir}')
+    print(f'Terraform shards updated: {base_dir} ({len(shards)} account groups)')
+
+    return manifest
+
+
+def resource_alias(resource_config: dict) -> str | None:
+
+    """Provider alias of a resource: "${thousandeyes.sw_team}" or "thousandeyes.sw_team" -> sw_team."""
+
+    provider = str(resource_config.get('provider', '')).strip('${}')
+    prefix, _, alias = provider.partition('.')
+
+    return alias if prefix == 'thousandeyes' and alias else None
+
+
+def shard_terraform_data(terraform_data: dict) -> tuple[dict, dict]:
+
+    """Split a hcl2-style dict by provider alias, returns ({alias: terraform_data}, unsharded terraform_data)."""
+
+    shards = {}
+    unsharded = {'provider': [], 'resource': []}
+
+    for provider in terraform_data.get('provider', []):
+        for provider_name, provider_config in provider.items():
+            alias = provider_config.get('alias')
+            target = shards.setdefault(alias, {'provider': [], 'resource': []}) if alias else unsharded
+            target['provider'].append({provider_name: provider_config})
+
+    for resource in terraform_data.get('resource', []):
+        for resource_type, resources in resource.items():
+            for resource_name, resource_config in resources.items():
+                alias = resource_alias(resource_config)
+                target = shards.setdefault(alias, {'provider': [], 'resource': []}) if alias else unsharded
+                target['resource'].append({resource_type: {resource_name: resource_config}})
+
+    return shards, unsharded
+
+
+def _write_data(path: str, terraform_data: dict) -> None:
+
+    with TerraformFileWriter(path, mode='w', atomic=True) as tf_file:
+        write_terraform(tf_file, terraform_data)
+
+
+def _write_shard(base_dir: str, file_name: str, alias: str, terraform_data: dict) -> dict:
+
+    shard_dir = os.path.join(base_dir, alias)
+    os.makedirs(shard_dir, exist_ok=True)
+    path = os.path.join(shard_dir, file_name)
+
+    _write_data(path, terraform_data)
+
+    return {
+        "alias": alias,
+        "path": alias,
+        "resources": len(terraform_data['resource']),
+        "main_sha256": file_digest(path),
+    }
+
+
+def write_sharded_terraform(file_path: str, terraform_data: dict, max_workers: int | None = None) -> dict:
+
+    """
+    Sharded version of the update_terraform write-back: <dir>/<alias>/<main.tf> per provider alias.
+
+    Providers and resources without an alias stay in file_path.
+    """
+
+    base_dir = os.path.dirname(os.path.abspath(file_path))
+    file_name = os.path.basename(file_path)
+    shards, unsharded = shard_terraform_data(terraform_data)
+
+    if max_workers is None:
+        max_workers = config.fetch_concurrency
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='shard') as pool:
+        results = list(pool.map(lambda item: _write_shard(base_dir, file_name, *item), shards.items()))
+
+    _write_data(file_path, unsharded)
+
+    return write_manifest(base_dir, results)
+
+
+def shard_paths(file_path: str) -> list:
+
+    """The per alias copies of file_path listed in the manifest that exist on disk."""
+
+    base_dir = os.path.dirname(os.path.abspath(file_path))
+    file_name = os.path.basename(file_path)
+    manifest = read_manifest(base_dir)
+
+    paths = (os.path.join(base_dir, shard["path"], file_name) for shard in manifest["shards"].values())
+    return [path for path in paths if os.path.exists(path)]
@@ -1,8 +1,11 @@
 import os
 import re
-import hcl2
 from tqdm import tqdm
-from services.thousandeyes_service import get_account_groups
+from controller.parse_terraform import parse_terraform_files
+from controller.shard_terraform import shard_paths, write_sharded_terraform
+from config.configuration import config
+from controller.hcl_renderer import write_terraform
+from services.thousandeyes_service import get_account_groups, account_group_registry
 
 
 def normalize_name(name):
@@ -19,12 +22,6 @@ def to_snake_case(name):
     return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
 
 
-def parse_terraform_file(file_path):
-    with open(file_path, 'r') as tf_file:
-        content = tf_file.read()
-    parsed = hcl2.loads(content)
-    return parsed
-
 def generate_provider_block(alias_name, account_group_id):
     return {
         'provider': {
@@ -60,17 +57,37 @@ def generate_resource_block(test, alias_name, existing_resource_config=None):
                 # No existing agents; we may decide to leave agents empty or handle accordingly
                 pass
 
-    # Add provider alias
+    # Add provider alias, como "${...}" para que render_string lo escriba sin comillas: provider = thousandeyes.alias
     if alias_name:
-        resource_config['provider'] = f'thousandeyes.{alias_name}'
+        resource_config['provider'] = f'${{thousandeyes.{alias_name}}}'
     else:
-        provider = existing_resource_config['provider']
-        resource_config['provider'] = provider.strip("${}")
-        pass
+        # Tal cual lo devuelve hcl2 ("${thousandeyes.alias}")
+        resource_config['provider'] = existing_resource_config['provider']
 
     return {resource_type: {resource_name: resource_config}}
 
-def update_terraform(file_path, test_objects, accounts):
+def load_terraform_data(file_path, shard=False):
+
+    """Parsed file_path, in sharded mode merged with its per account group copies (parsed in parallel)."""
+
+    paths = [file_path] if os.path.exists(file_path) else []
+
+    if shard:
+        paths += shard_paths(file_path)
+
+    terraform_data = {}
+
+    for parsed in parse_terraform_files(paths).values():
+        for block_type in ('provider', 'resource'):
+            terraform_data.setdefault(block_type, []).extend(parsed.get(block_type, []))
+
+    return terraform_data
+
+
+def update_terraform(file_path, test_objects, accounts, shard=None):
+
+    if shard is None:
+        shard = config.tf_sharded
 
     # ya llegamso aqui, lo que tenemos que hacer es ver si se hara update o delete y quitarle esas banderas
 
@@ -79,10 +96,7 @@ def update_terraform(file_path, test_objects, accounts):
 
 
     # Parse existing Terraform configuration
-    if os.path.exists(file_path):
-        terraform_data = parse_terraform_file(file_path)
-    else:
-        terraform_data = {}
+    terraform_data = load_terraform_data(file_path, shard=shard)
 
     existing_providers = {}
     existing_resources = {}
@@ -106,7 +120,7 @@ def update_terraform(file_path, test_objects, accounts):
     # Update providers -- esta condicion en teoria es imposible que exista porque en vez de hacer update, haria el create
     # entonces el mismo test se crearia pero en un AG diferente
     for account_name in accounts:
-        account_group_id = acc_aids.get(account_name)
+        account_group_id = account_group_registry.by_name(account_name)
         alias_name = re.sub(r'[^a-zA-Z0-9]', '', account_name)
 
         if alias_name not in existing_providers:
@@ -132,14 +146,14 @@ def update_terraform(file_path, test_objects, accounts):
                     # Process agentsLabel
                     label_name, account_group = test.agentsLabel.split("-->")
                     label_name, account_group = label_name.strip(), account_group.strip()
-                    aid = acc_aids[account_group]
+                    aid = account_group_registry.require(account_group)
                     test.agents = labels_agents_mapping.get((label_name, str(aid)), {}).get('agents', [])
                 else:
                     # AgentsLabel is empty, do not modify test.agents; leave it empty
                     account_group = " "
             else:
                 account_group = test.accountGroupName
-                aid = acc_aids[account_group]
+                aid = account_group_registry.require(account_group)
 
             # Aqui si el test en el update no le ponen label entonces el alias name no va a existir pero en teoria no importa porque
             # si se encuentra un test entonces ya deberia de tener ese resource, no se puede modificar 
@@ -169,43 +183,11 @@ def update_terraform(file_path, test_objects, accounts):
             }
         })
 
-    # Write back to main.tf
-    with open(file_path, 'w') as tf_file:
-        tf_content = ''
-        # Write providers
-        if 'provider' in terraform_data:
-            for provider in terraform_data['provider']:
-                for provider_name, provider_config in provider.items():
-                    tf_content += f'provider "{provider_name}" {{\n'
-                    for k, v in provider_config.items():
-                        tf_content += f'  {k} = "{v}"\n'
-                    tf_content += '}\n\n'
-
-        # Write resources
-        if 'resource' in terraform_data:
-            for resource in terraform_data['resource']:
-                for resource_type, resources in resource.items():
-                    for resource_name, resource_config in resources.items():
-                        tf_content += f'resource "{resource_type}" "{resource_name}" {{\n'
-                        for k, v in resource_config.items():
-                            if isinstance(v, bool):
-                                tf_content += f'  {k} = {"true" if v else "false"}\n'
-                            elif isinstance(v, str):
-                                if k == 'provider':
-                                    if '${' in v:
-                                        v = v.strip("${}")
-                                    tf_content += f'  {k} = {v}\n'
-                                else:
-                                    tf_content += f'  {k} = "{v}"\n'
-                            elif isinstance(v, list) and k == 'agents':
-                                for agent in v:
-                                    tf_content += '  agents {\n'
-                                    for ak, av in agent.items():
-                                        tf_content += f'    {ak} = {av}\n'
-                                    tf_content += '  }\n'
-                            else:
-                                tf_content += f'  {k} = {v}\n'
-                        tf_content += '}\n\n'
-        tf_file.write(tf_content)
+    # Write back to main.tf (one per account group alias in sharded mode)
+    if shard:
+        write_sharded_terraform(file_path, terraform_data)
+    else:
+        with open(file_path, 'w') as tf_file:
+            write_terraform(tf_file, terraform_data)
 
     print(f'Terraform configuration updated: {file_path}')
@@ -1,63 +1,164 @@
 import csv
 import sys
+import gzip
+import argparse
 from pathlib import Path
+from contextlib import aclosing
 
 if __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from services.connector_service import get_data
+from services.connector_service import get_paginated, aa_get_paginated, run_in_session
 from config.configuration import config
 from services.logging_service import my_logger
-from services.thousandeyes_service import get_account_groups, URL
+from services.thousandeyes_service import get_account_groups, a_get_account_groups, a_iter_in_order, URL
+from services.records import AgentRow
 
-def get_all_agents() -> list:
-    
-    """Fetch all ThousandEyes agents and write that info at a csv file"""
+AGENT_TYPES = "enterprise,enterprise-cluster"
+HEADER = ['Account Name', 'Account ID', 'Agent Name', 'Agent ID', 'Agent Type', 'Agent Location']
 
-    agents_list = []
+
+def agent_row(name, aid, agent: dict) -> AgentRow:
+
+    return AgentRow(name, aid, agent.get("agentName"), agent.get("agentId"), agent.get("agentType"), agent.get("location"))
+
+
+def get_all_agents():
+
+    """Fetch all ThousandEyes agents, the rows are yielded one by one so they can be streamed to the csv file"""
 
     # We need to fetch all the account groups first
     account_groups = get_account_groups()
 
     for name, aid in account_groups.items():
 
-        params = {"aid": aid, "agentTypes":"enterprise,enterprise-cluster"}
+        params = {"aid": aid, "agentTypes": AGENT_TYPES}
 
         try:
 
-            status_code, agents = get_data(headers=config.headers, endp_url=f'{URL}agents', params=params)
+            status_code, agents = get_paginated(headers=config.headers, endp_url=f'{URL}agents', params=params, items_key="agents")
 
             if status_code != 200:
                 my_logger.error(f"Failed to fetch agents for account group {name} (AID: {aid}). Status code: {status_code}")
                 continue
-        
-        
-            if isinstance(agents, dict) and "agents" in agents:
-                for agent in agents.get("agents", []):
-                    if isinstance(agent, dict):
-                        single_agent = [name, aid, agent.get("agentName"), agent.get("agentId"), agent.get("agentType"), agent.get("location")]
-                        agents_list.append(single_agent)
+
+
+            for agent in agents:
+                if isinstance(agent, dict):
+                    yield agent_row(name, aid, agent)
 
         except Exception as e:
             my_logger.error(f"Error fetching agents: {e}")
             raise e
-        
-    return agents_list
-        
 
-def write_to_csv(formatted_agents:list):
+
+async def a_get_all_agents(max_concurrency: int | None = None, queue_size: int = 1000):
+
+    """
+    Async version of get_all_agents: the account groups are fetched concurrently and the rows are yielded
+    as their pages arrive, in the order of the account groups.
+
+    Enterprise agents show up in every account group they are shared with, each agentId is yielded
+    once, with the first account group of the org that has it (same rows on every run). Every account
+    group fetched ahead keeps at most queue_size rows waiting for the consumer.
+    """
+
+    if max_concurrency is None:
+        max_concurrency = config.fetch_concurrency
+
+    account_groups = await a_get_account_groups()
+
+    async def fetch_agents(account):
+        name, aid = account
+        return await aa_get_paginated(config.headers, f'{URL}agents', {"aid": aid, "agentTypes": AGENT_TYPES}, "agents")
+
+    seen = set()
+
+    try:
+
+        async with aclosing(a_iter_in_order(list(account_groups.items()), fetch_agents, max_concurrency, queue_size)) as responses:
+
+            async for (name, aid), status_code, agents in responses:
+
+                if status_code != 200:
+                    my_logger.error(f"Failed to fetch agents for account group {name} (AID: {aid}). Status code: {status_code}")
+                    continue
+
+                async for agent in agents:
+                    if isinstance(agent, dict) and agent.get("agentId") not in seen:
+                        seen.add(agent.get("agentId"))
+                        yield agent_row(name, aid, agent)
+
+    except Exception as e:
+        my_logger.error(f"Error fetching agents: {e}")
+        raise
+
+    my_logger.info(f'{len(seen)} unique agents fetched from {len(account_groups)} account groups')
+
+
+def open_csv(path: str, compress: bool = False):
+
+    # gzip en modo texto, el csv se escribe igual que sin comprimir
+    if compress:
+        return gzip.open(path, 'wt', newline='', compresslevel=6)
+    return open(path, 'w', newline='')
+
+
+def csv_writer(csvfile):
+
+    writer = csv.writer(csvfile, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+    writer.writerow(HEADER)
+    return writer
+
+
+def write_to_csv(formatted_agents, path: str = 'agents_list.csv', compress: bool = False) -> int:
     """Write the fetched agents to a CSV file"""
 
-    with open('agents_list.csv', 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile, delimiter=',',
-                                quotechar='|', quoting=csv.QUOTE_MINIMAL)
-        
-        writer.writerow(['Account Name', 'Account ID', 'Agent Name', 'Agent ID', 'Agent Type', 'Agent Location'])
+    count = 0
+
+    with open_csv(path, compress) as csvfile:
+
+        writer = csv_writer(csvfile)
 
         for agent in formatted_agents:
             writer.writerow(agent)
+            count += 1
+
+    return count
+
+
+async def a_write_to_csv(path: str = 'agents_list.csv', compress: bool = False, max_concurrency: int | None = None) -> int:
+
+    """Stream the rows of a_get_all_agents to the CSV file as they arrive, returns the agents written."""
+
+    count = 0
+
+    with open_csv(path, compress) as csvfile:
+
+        writer = csv_writer(csvfile)
+
+        async for agent in a_get_all_agents(max_concurrency):
+            writer.writerow(agent)
+            count += 1
+
+    return count
+
 
 if __name__ == "__main__":
-    
-    formatted_agents = get_all_agents()
-    write_to_csv(formatted_agents)
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Export the enterprise agents of every account group to a CSV file")
+    parser.add_argument("--output", metavar="PATH", help="CSV file (default agents_list.csv, agents_list.csv.gz with --gzip)")
+    parser.add_argument("--gzip", action="store_true", help="gzip compressed output")
+    parser.add_argument("--concurrency", type=int, help="account groups fetched at once (FETCH_CONCURRENCY)")
+    parser.add_argument("--sync", action="store_true", help="one account group at a time, without removing duplicated agents")
+    args = parser.parse_args()
+
+    output = args.output or ('agents_list.csv.gz' if args.gzip else 'agents_list.csv')
+
+    if args.sync:
+        formatted_agents = get_all_agents()
+        written = write_to_csv(formatted_agents, output, args.gzip)
+    else:
+        written = run_in_session(a_write_to_csv(output, args.gzip, args.concurrency))
+
+    print(f'{written} agents written to {output}')
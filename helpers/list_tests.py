@@ -5,16 +5,15 @@ from pathlib import Path
 if __package__ is None:
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from services.connector_service import get_data
+from services.connector_service import get_paginated
 from config.configuration import config
 from services.logging_service import my_logger
 from services.thousandeyes_service import get_account_groups, URL
+from services.records import TestRow
 
-def get_all_tests() -> list:
+def get_all_tests():
     
-    """Fetch all ThousandEyes tests and write that info at a csv file"""
-
-    tests_list = []
+    """Fetch all ThousandEyes tests, the rows are yielded one by one so they can be streamed to the csv file"""
 
     # We need to fetch all the account groups first
     account_groups = get_account_groups()
@@ -24,27 +23,23 @@ def get_all_tests() -> list:
         params = {"aid": aid}
 
         try:
-            status_code, tests = get_data(headers=config.headers, endp_url=f'{URL}tests', params=params)
+            status_code, tests = get_paginated(headers=config.headers, endp_url=f'{URL}tests', params=params, items_key="tests")
 
             if status_code != 200:
                 my_logger.error(f"Failed to fetch tests for account group {name} (AID: {aid}). Status code: {status_code}")
                 continue
         
-            if isinstance(tests, dict) and "tests" in tests:
-                for test in tests.get("tests", []):
-                    if isinstance(test, dict):
-                        single_test = [name, aid, test.get("testName"), test.get("testId"), test.get("type")]
-                        tests_list.append(single_test)
+            for test in tests:
+                if isinstance(test, dict):
+                    yield TestRow(name, aid, test.get("testName"), test.get("testId"), test.get("type"))
 
 
         except Exception as e:
             my_logger.error(f"Error fetching tests: {e}")
             raise e
         
-    return tests_list
-        
 
-def write_to_csv(formatted_tests:list):
+def write_to_csv(formatted_tests):
     """Write the fetched tests to a CSV file"""
 
     with open('tests_list.csv', 'w', newline='') as csvfile:
@@ -1,4 +1,117 @@
-from services.interactive_prompt import user_prompt
+import os
+import re
+import sys
+import argparse
+
+#############################
+#           CLI
+#############################
+
+
+def add_export_options(parser: argparse.ArgumentParser) -> None:
+
+    """Options shared by export and multi-org."""
+
+    parser.add_argument("--concurrency", type=int, help="max requests in flight (FETCH_CONCURRENCY)")
+    parser.add_argument("--queue-size", type=int, help="account groups buffered per pipeline stage (PIPELINE_QUEUE_SIZE)")
+    parser.add_argument("--shard", action="store_true", help="one Terraform directory per account group (TF_SHARDED)")
+    parser.add_argument("--no-incremental", action="store_true", help="append every block even if already in the project")
+    parser.add_argument("--atomic", action="store_true", help="write through temp files renamed on success")
+    parser.add_argument("--resources", action="store_true", help="also write the full resource blocks from the test details (EXPORT_RESOURCES)")
+    parser.add_argument("--no-cache", action="store_true", help="skip the on-disk HTTP response cache")
+
+
+def build_parser() -> argparse.ArgumentParser:
+
+    parser = argparse.ArgumentParser(description="ThousandEyes tests to Terraform import blocks")
+    subparsers = parser.add_subparsers(dest="command")
+
+    export = subparsers.add_parser("export", help="Non interactive export of the tests of the selected account groups")
+
+    selectors = export.add_argument_group("account group selectors (any match is exported)")
+    selectors.add_argument("--all", action="store_true", dest="select_all", help="every account group of the org")
+    selectors.add_argument("--account", action="append", default=[], metavar="NAME", help="account group name (repeatable)")
+    selectors.add_argument("--aid", action="append", default=[], metavar="AID", help="account group id (repeatable)")
+    selectors.add_argument("--match", action="append", default=[], metavar="REGEX", help="regex over the account group names (repeatable)")
+
+    export.add_argument("--output", metavar="PATH", help="Terraform project path (TERRAFORM_PROJECT_PATH)")
+    add_export_options(export)
+    export.add_argument("--profile", metavar="MODES", help="time the export phases: time, cprofile, tracemalloc or all, comma separated (PROFILE)")
+    export.add_argument("--profile-report", metavar="PATH", help="profiling report file (PROFILE_REPORT)")
+    export.add_argument("--metrics", metavar="PATH", help="write the API metrics to PATH, Prometheus text for *.prom, JSON otherwise (METRICS_FILE)")
+
+    multi = subparsers.add_parser("multi-org", help="Export several orgs in parallel, one process per org (see services/multi_org_service.py)")
+    multi.add_argument("--orgs", metavar="PATH", help="JSON file with the orgs, tokens and output paths (ORGS_FILE)")
+    multi.add_argument("--org", action="append", default=[], metavar="NAME", help="only export this org of the file (repeatable)")
+    multi.add_argument("--workers", type=int, help="orgs exported at once (ORG_WORKERS)")
+    add_export_options(multi)
+
+    return parser
+
+
+def apply_overrides(args) -> None:
+
+    """CLI options override the .env values, the config reads them when it is first imported."""
+
+    overrides = {
+        "TERRAFORM_PROJECT_PATH": getattr(args, "output", None),
+        "FETCH_CONCURRENCY": args.concurrency,
+        "PIPELINE_QUEUE_SIZE": args.queue_size,
+        "TF_SHARDED": "true" if args.shard else None,
+        "INCREMENTAL_IMPORTS": "false" if args.no_incremental else None,
+        "TF_ATOMIC_WRITE": "true" if args.atomic else None,
+        "HTTP_CACHE": "false" if args.no_cache else None,
+        "EXPORT_RESOURCES": "true" if args.resources else None,
+        "METRICS_FILE": getattr(args, "metrics", None),
+        "PROFILE": getattr(args, "profile", None),
+        "PROFILE_REPORT": getattr(args, "profile_report", None),
+    }
+
+    for key, value in overrides.items():
+        if value is not None:
+            os.environ[key] = str(value)
+
+
+def main(argv=None) -> int:
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+
+        if not (args.select_all or args.account or args.aid or args.match):
+            parser.error("export needs at least one selector: --all, --account, --aid or --match")
+
+        for pattern in args.match:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                parser.error(f"invalid --match regex {pattern!r}: {e}")
+
+        apply_overrides(args)
+
+        from services.batch_export import run_batch_export
+        return run_batch_export(args.account, args.aid, args.match, args.select_all)
+
+    if args.command == "multi-org":
+
+        # Los workers heredan el environment, las opciones valen para todos los orgs (el "env" del org manda)
+        apply_overrides(args)
+
+        from config.configuration import config
+        from services.multi_org_service import load_orgs, run_multi_org
+
+        try:
+            orgs = load_orgs(args.orgs or config.orgs_file, only=args.org, log_dir=config.log_dir)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+
+        return run_multi_org(orgs, workers=args.workers or config.org_workers)
+
+    from services.interactive_prompt import user_prompt
+    user_prompt()
+    return 0
+
 
 #############################
 #           MAIN
@@ -6,4 +119,4 @@ from services.interactive_prompt import user_prompt
 
 if __name__ == "__main__":
 
-    user_prompt()
\ No newline at end of file
+    sys.exit(main())
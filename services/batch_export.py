@@ -0,0 +1,129 @@
+"""
+Headless version of the "Get TE tests" flow of user_prompt, for cron / CI.
+
+Exit codes:
+    0  export finished
+    1  unexpected error
+    2  invalid arguments (argparse)
+    3  no account group fetched or matched by the selectors
+    4  export finished but some account groups could not be fetched
+"""
+
+import re
+import time
+from config.configuration import config
+from services.logging_service import my_logger
+from services.profiling_service import profiler, profile_run
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_NO_ACCOUNTS = 3
+EXIT_PARTIAL = 4
+
+
+def select_account_groups(accounts: dict, names=(), aids=(), patterns=(), select_all: bool = False) -> dict:
+
+    """Account groups matched by any selector: exact names, aids or regular expressions over the names."""
+
+    if select_all:
+        return dict(accounts)
+
+    names = set(names)
+    aids = {str(aid) for aid in aids}
+    compiled = [re.compile(pattern) for pattern in patterns]
+
+    return {
+        name: aid for name, aid in accounts.items()
+        if name in names or str(aid) in aids or any(regex.search(name) for regex in compiled)
+    }
+
+
+def run_batch_export(names=(), aids=(), patterns=(), select_all: bool = False, summary: dict | None = None) -> int:
+
+    """
+    Fetch the selected account groups tests and generate the Terraform files, returns the exit code.
+
+    summary (when given) gets the account groups exported, import / resource blocks written, the account
+    groups that failed (failures) and the tests whose details could not be fetched (failed_tests).
+    """
+
+    if summary is None:
+        summary = {}
+
+    from services.thousandeyes_service import get_account_groups, get_existant_tests
+    from services.metrics_service import metrics, report_metrics
+
+    # Las metricas son del proceso, cada export reporta solo sus requests
+    metrics.reset()
+    start = time.time()
+
+    try:
+
+        with profile_run(logger=my_logger):
+
+            with profiler.phase('select_accounts'):
+                accounts = get_account_groups()
+                selected = select_account_groups(accounts, names, aids, patterns, select_all) if accounts else {}
+
+            if not accounts:
+                my_logger.error(f'No account groups fetched for {config.org_name}')
+                print(f'No account groups fetched for {config.org_name}')
+                return EXIT_NO_ACCOUNTS
+
+            if not selected:
+                my_logger.error('No account group matched the selectors')
+                print('No account group matched the selectors')
+                return EXIT_NO_ACCOUNTS
+
+            my_logger.info(f'Batch export of the account groups {list(selected)}')
+            failures = []
+            failed_tests = []
+            summary.update(account_groups=len(selected), failures=failures, failed_tests=failed_tests)
+
+            if config.export_pipeline and not config.tf_sharded:
+
+                from services.pipeline_service import run_export_pipeline
+
+                written = run_export_pipeline(selected, failures=failures)
+
+            else:
+
+                tests = get_existant_tests(selected, concurrent=config.async_fetch, failures=failures)
+
+                if config.tf_sharded:
+                    from controller.shard_terraform import create_sharded_terraform
+                    manifest = create_sharded_terraform(existing_tests=tests)
+                    written = sum(shard.get('imports_written', 0) for shard in manifest['shards'].values())
+                else:
+                    from controller.create_terraform import create_import_terraform
+                    written = create_import_terraform(existing_tests=tests)
+
+            if config.export_resources:
+                from services.hydration_service import run_resource_export
+                resources = run_resource_export(selected, failures=failures, failed_tests=failed_tests)
+                summary['resources'] = resources
+                print(f'{resources} resource blocks written')
+
+            roundtrip = time.time() - start
+            summary['imports'] = written
+            print(f'{len(selected)} account groups exported, {written} import blocks written in {roundtrip:.1f}s')
+            my_logger.info(f'Batch export finished in {roundtrip:.1f}s, {written} import blocks written')
+
+            print(report_metrics(my_logger))
+
+            if failures:
+                print(f'Failed account groups: {", ".join(failures)}')
+
+            if failed_tests:
+                print(f'Failed test details ({len(failed_tests)}): {", ".join(failed_tests)}')
+
+            if failures or failed_tests:
+                return EXIT_PARTIAL
+
+            return EXIT_OK
+
+    except Exception as e:
+        my_logger.exception(f'Batch export failed: {e}')
+        print(f'Batch export failed: {e}')
+        return EXIT_ERROR
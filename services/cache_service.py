@@ -0,0 +1,240 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit
+from config.configuration import config
+
+
+class CacheEntry:
+
+    """A cached response body with its validators."""
+
+    __slots__ = ('body', 'etag', 'last_modified', 'fresh')
+
+    def __init__(self, body: bytes, etag: str | None, last_modified: str | None, fresh: bool):
+
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+    def json(self):
+
+        return json.loads(self.body)
+
+
+class ResponseCache:
+
+    """
+    Persistent GET response cache stored in SQLite.
+
+    Every endpoint (first path segment after /v7/, e.g. "tests") has its own TTL, endpoints without
+    a TTL are not cached. Stale entries keep their ETag / Last-Modified so they can be revalidated
+    with a conditional request, and the least recently used entries are evicted once the cache is
+    bigger than max_bytes. The SQLite calls block, the async connector runs them in a thread.
+    """
+
+    def __init__(self, path: str, ttls: dict, max_bytes: int):
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        self.ttls = ttls
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY, endpoint TEXT, body BLOB, etag TEXT, last_modified TEXT,'
+            ' stored_at REAL, last_access REAL, size INTEGER)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)')
+        # Running total of the stored bodies, so a put does not scan the table
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def endpoint(url: str) -> str:
+
+        """First path segment after the API version, /v7/tests/http-server/1 -> tests."""
+
+        parts = [part for part in urlsplit(url).path.split('/') if part]
+        if parts and parts[0].startswith('v') and parts[0][1:].isdigit():
+            parts = parts[1:]
+        return parts[0] if parts else ''
+
+    def ttl(self, url: str) -> float | None:
+
+        return self.ttls.get(self.endpoint(url))
+
+    @staticmethod
+    def key(url: str, params, headers) -> str:
+
+        """Cache key of a request, the token is part of it so orgs never share entries."""
+
+        params = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        auth = (headers or {}).get('Authorization', '')
+        raw = json.dumps([url, params, hashlib.sha256(auth.encode()).hexdigest()])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str, url: str) -> CacheEntry | None:
+
+        ttl = self.ttl(url)
+        if ttl is None:
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+
+        body, etag, last_modified, stored_at = row
+        return CacheEntry(body, etag, last_modified, now - stored_at < ttl)
+
+    def put(self, key: str, url: str, body: bytes, etag: str | None = None, last_modified: str | None = None) -> None:
+
+        if self.ttl(url) is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, self.endpoint(url), body, etag, last_modified, now, now, len(body)),
+            )
+            self._size += len(body) - (row[0] if row else 0)
+            self._evict()
+
+    def refresh(self, key: str) -> None:
+
+        """Mark an entry as fresh again (the API answered 304 Not Modified)."""
+
+        now = time.time()
+        with self._lock:
+            self._db.execute('UPDATE responses SET stored_at = ?, last_access = ? WHERE key = ?', (now, now, key))
+
+    def discard(self, key: str) -> None:
+
+        """Drop one entry, the next request goes to the API."""
+
+        with self._lock:
+            row = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._size -= row[0]
+
+    def invalidate(self, endpoint: str | None = None) -> None:
+
+        with self._lock:
+            if endpoint is None:
+                self._db.execute('DELETE FROM responses')
+            else:
+                self._db.execute('DELETE FROM responses WHERE endpoint = ?', (endpoint,))
+            self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def _evict(self) -> None:
+
+        """Drop the least recently used entries until the cache fits in max_bytes (lock held by the caller)."""
+
+        if self._size <= self.max_bytes:
+            return
+
+        # Solo al pasarse del limite: otro proceso (multi-org) puede haber cambiado la tabla
+        total = self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._db.execute('SELECT key, size FROM responses ORDER BY last_access').fetchall()
+        to_delete = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            total -= size
+
+        self._db.executemany('DELETE FROM responses WHERE key = ?', to_delete)
+        self._size = total
+
+    def close(self) -> None:
+
+        with self._lock:
+            self._db.close()
+
+
+class TestDetailCache:
+
+    """
+    Test details (/tests/{type}/{id}) stored by account group + test id and its modifiedDate.
+
+    A test that was not modified since it was cached never goes back to the API, there is no TTL: an
+    entry is only replaced when the list of tests reports a newer modifiedDate.
+    """
+
+    def __init__(self, path: str):
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS details (aid TEXT, test_id TEXT, modified TEXT, body BLOB, PRIMARY KEY (aid, test_id))'
+        )
+
+    def get(self, aid, test_id, modified: str | None) -> dict | None:
+
+        if not modified:
+            return None
+
+        with self._lock:
+            row = self._db.execute(
+                'SELECT body FROM details WHERE aid = ? AND test_id = ? AND modified = ?', (str(aid), str(test_id), modified)
+            ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def put(self, aid, test_id, modified: str | None, detail: dict) -> None:
+
+        if not modified:
+            return
+
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?)', (str(aid), str(test_id), modified, json.dumps(detail).encode())
+            )
+
+    def close(self) -> None:
+
+        with self._lock:
+            self._db.close()
+
+
+def build_response_cache() -> ResponseCache | None:
+
+    """Cache configured from the environment, None when HTTP_CACHE is disabled."""
+
+    if not config.http_cache:
+        return None
+
+    return ResponseCache(
+        path=os.path.join(config.http_cache_dir, 'http_cache.sqlite'),
+        ttls=config.http_cache_ttls,
+        max_bytes=config.http_cache_max_mb * 1024 * 1024,
+    )
+
+
+def build_test_detail_cache() -> TestDetailCache | None:
+
+    """Test details cache, None when HTTP_CACHE is disabled."""
+
+    if not config.http_cache:
+        return None
+
+    return TestDetailCache(os.path.join(config.http_cache_dir, 'test_details.sqlite'))
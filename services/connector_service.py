@@ -1,41 +1,441 @@
-import httpx
+import os
 import time
+import atexit
+import random
 import asyncio
+import weakref
+import threading
+import importlib.util
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from services.logging_service import setup_api_calls_logger
+from services.rate_limit_service import governor
+from services.cache_service import build_response_cache
+from services.metrics_service import metrics
 from config.configuration import config
 
 # Configurar el logger para las llamadas de API
 logging = setup_api_calls_logger()
 
 
-limits = httpx.Limits(max_keepalive_connections=100, max_connections=150, keepalive_expiry=50)
-timeout = httpx.Timeout(27.7, read=None, pool=7.7)
+def http2_available() -> bool:
 
+    # h2 es opcional (httpx[http2]), sin el paquete se sigue con HTTP/1.1
+    return importlib.util.find_spec('h2') is not None
 
-##############NO Async###################################
+
+def client_options(http2: bool | None = None) -> dict:
+
+    """
+    httpx.Client / AsyncClient arguments from the config: pool limits, timeouts and protocol.
+
+    With http2 the requests share a few multiplexed connections. Over https the protocol is negotiated
+    (ALPN), a plain http:// API URL (e.g. the benchmarks mock) is spoken HTTP/2 from the first byte.
+    """
+
+    import httpx
+
+    if http2 is None:
+        http2 = config.http2
+
+    if http2 and not http2_available():
+        logging.warning('HTTP2 is enabled but the h2 package is not installed (pip install "httpx[http2]"), using HTTP/1.1')
+        http2 = False
+
+    options = {
+        'limits': httpx.Limits(
+            max_connections=config.http_max_connections,
+            max_keepalive_connections=min(config.http_max_keepalive, config.http_max_connections),
+            keepalive_expiry=config.http_keepalive_expiry,
+        ),
+        'timeout': httpx.Timeout(config.http_connect_timeout, read=None, pool=config.http_pool_timeout),
+        'http2': http2,
+    }
+
+    if http2 and config.api_url.startswith('http://'):
+        options['http1'] = False
+
+    return options
+
+
+############## Clients and engine ######################
 class ConnectorSingleton:
+
+    """Plain sync httpx.Client (super_http) for ad hoc scripts, the connector functions go through the engine."""
+
     _instance = None
 
     @classmethod
     def get_instance(cls):
         
         if cls._instance is None:
-            
-            limits = httpx.Limits(max_keepalive_connections=300, max_connections=1000, keepalive_expiry=100)
-            timeout = httpx.Timeout(17.7, read=None, pool=7.7)
-            cls._instance = httpx.Client(limits=limits, timeout=timeout)
+            import httpx
+            cls._instance = httpx.Client(**client_options())
         
         return cls._instance
 
+    @classmethod
+    def close(cls) -> None:
 
-super_http = ConnectorSingleton.get_instance()
+        if cls._instance is not None:
+            cls._instance.close()
+            cls._instance = None
 
-def log_request(endpoint, status_code, roundtrip):
 
-    """Log the request details including the time taken and status code."""
-    
-    logging.info(f"Status Code {status_code}: {endpoint} time: {roundtrip:.4f} seconds")
+class AsyncConnectorSingleton:
+
+    """
+    Pooled AsyncClient of the request engine, one per event loop.
+
+    The connections of the pool belong to the loop that opened them, so the loop of an asyncio.run()
+    and the background loop of the sync facade never share a client. Outside of a loop the client of
+    the background loop is returned.
+    """
+
+    _instances = weakref.WeakKeyDictionary()
+    _instance = None  # client handed out last, None until the first request
+
+    @classmethod
+    def get_instance(cls):
+
+        # Se crea con el primer request async, importar el modulo no abre nada
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = engine.start()
+
+        client = cls._instances.get(loop)
+        if client is None:
+            import httpx
+            client = cls._instances[loop] = httpx.AsyncClient(**client_options())
+
+        cls._instance = client
+        return client
+
+    @classmethod
+    async def aclose(cls) -> None:
+
+        """Close the client of the running loop."""
+
+        client = cls._instances.pop(asyncio.get_running_loop(), None)
+
+        if client is not None:
+            if cls._instance is client:
+                cls._instance = None
+            await client.aclose()
+
+
+class BackgroundEngine:
+
+    """
+    Event loop in a daemon thread where the sync facade (get_data, post_data, ...) runs the async engine.
+
+    Started on the first sync request and stopped at exit or by the outermost sync ConnectorSession,
+    a later request starts it again.
+    """
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self.loop = None
+        self._thread = None
+        self.profiler = None
+
+    def start(self):
+
+        with self._lock:
+
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                if self.profiler is not None:
+                    # Primer callback del loop, ya en el thread del engine
+                    self.loop.call_soon(self.profiler.enable)
+                self._thread = threading.Thread(target=self.loop.run_forever, name='connector-engine', daemon=True)
+                self._thread.start()
+
+            return self.loop
+
+    def profile(self, profiler) -> None:
+
+        """
+        Enable profiler (a cProfile.Profile, None to stop) in the loop thread, now and whenever the engine
+        starts again. cProfile only sees the thread that enables it, profile_run uses it for the requests.
+        """
+
+        async def swap(previous, current):
+            if previous is not None:
+                previous.disable()
+            if current is not None:
+                current.enable()
+
+        with self._lock:
+            previous, self.profiler = self.profiler, profiler
+            loop = self.loop
+
+        if loop is not None and threading.current_thread() is not self._thread:
+            asyncio.run_coroutine_threadsafe(swap(previous, profiler), loop).result(timeout=5)
+
+    def submit(self, coro):
+
+        """Schedule coro on the engine loop, returns a concurrent.futures.Future."""
+
+        loop = self.start()
+
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError('sync connector function called from the engine loop, await the async version instead')
+
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro):
+
+        """Run coro on the engine loop and wait for its result."""
+
+        return self.submit(coro).result()
+
+    def stop(self) -> None:
+
+        with self._lock:
+            loop, thread, self.loop, self._thread = self.loop, self._thread, None, None
+            profiler = self.profiler
+
+        if loop is None:
+            return
+
+        try:
+            asyncio.run_coroutine_threadsafe(AsyncConnectorSingleton.aclose(), loop).result(timeout=5)
+        except Exception as e:
+            logging.warning(f'Connector engine client not closed cleanly: {e!r}')
+
+        if profiler is not None:
+            loop.call_soon_threadsafe(profiler.disable)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+        if not thread.is_alive():
+            loop.close()
+
+    def _reset_in_child(self) -> None:
+
+        # Un proceso hijo (fork) no hereda el thread del loop, el engine se vuelve a crear si hace falta
+        self._lock = threading.Lock()
+        self.loop = None
+        self._thread = None
+        self.profiler = None
+
+
+engine = BackgroundEngine()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=engine._reset_in_child)
+
+
+def run_sync(coro):
+
+    """Sync facade: run a coroutine of the engine on the background loop and return its result."""
+
+    return engine.run(coro)
+
+
+class ConnectorSession:
+
+    """
+    Lifecycle of the shared clients, the one entry point to open and close them.
+
+        async with ConnectorSession() as client:   # AsyncClient of the running loop
+            ...
+        with ConnectorSession():                   # background engine of the sync functions
+            ...
+
+    Sessions nest: only the outermost one closes, so the helpers can open a session and still be
+    called from a bigger one (e.g. the export pipeline inside the batch export). The async client is
+    closed before its event loop goes away, the background engine is also stopped at exit.
+    """
+
+    _depth = {'sync': 0, 'async': 0}
+
+    def __enter__(self):
+
+        self._depth['sync'] += 1
+        engine.start()
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+
+        self._depth['sync'] -= 1
+        if not self._depth['sync']:
+            engine.stop()
+
+    async def __aenter__(self):
+
+        self._depth['async'] += 1
+        return AsyncConnectorSingleton.get_instance()
+
+    async def __aexit__(self, exc_type, exc, tb):
+
+        self._depth['async'] -= 1
+        if not self._depth['async']:
+            await AsyncConnectorSingleton.aclose()
+
+
+def run_in_session(coro):
+
+    """asyncio.run(coro) inside a ConnectorSession, the async client is closed before the loop ends."""
+
+    async def main():
+        async with ConnectorSession():
+            return await coro
+
+    return asyncio.run(main())
+
+
+def close_clients() -> None:
+
+    """Stop the background engine (closing its client) and close the plain sync client."""
+
+    engine.stop()
+    ConnectorSingleton.close()
+
+
+atexit.register(close_clients)
+
+
+_response_cache = None
+_response_cache_ready = False
+
+
+def get_response_cache():
+
+    """Persistent cache for the GET requests, opened on first use, None when disabled (HTTP_CACHE=false)."""
+
+    global _response_cache, _response_cache_ready
+
+    if not _response_cache_ready:
+        _response_cache = build_response_cache()
+        _response_cache_ready = True
+
+    return _response_cache
+
+
+def drop_cached(headers, endp_url, params) -> None:
+
+    """Forget the cached response of a GET so the next get_data asks the API (no-op without cache)."""
+
+    response_cache = get_response_cache()
+
+    if response_cache is not None:
+        response_cache.discard(response_cache.key(endp_url, params, headers))
+
+
+def __getattr__(name):
+
+    # super_http, a_client and response_cache used to be built at import time, they are kept as lazy attributes
+    if name == 'super_http':
+        return ConnectorSingleton.get_instance()
+    if name == 'a_client':
+        return AsyncConnectorSingleton.get_instance()
+    if name == 'response_cache':
+        return get_response_cache()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class RetryPolicy:
+
+    """
+    Decide if and when a request is retried.
+
+    Idempotent methods (GET, PUT, ...) are retried on 429, 5xx and transport errors. POST is only
+    retried when the request surely did not reach the API: a 429 or a failure opening the connection.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+    def __init__(self, max_attempts: int = 5, backoff_base: float = 1.0, backoff_max: float = 30.0):
+
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @staticmethod
+    def not_sent_errors() -> tuple:
+
+        """Transport errors raised before the request left (httpx is only imported once a request fails)."""
+
+        import httpx
+        return (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+    def backoff(self, attempt: int) -> float:
+
+        """Exponential backoff with full jitter."""
+
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    @staticmethod
+    def server_delay(response) -> float | None:
+
+        """Seconds requested by the API through Retry-After, or the rate limit reset header on a 429."""
+
+        retry_after = response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now().astimezone()).total_seconds())
+                except (TypeError, ValueError):
+                    pass
+
+        # El reset viene en todas las respuestas, solo dice cuanto esperar cuando el limite se agoto
+        reset = response.headers.get('x-organization-rate-limit-reset') if response.status_code == 429 else None
+        if reset:
+            try:
+                return max(0.0, float(reset) - time.time()) + 1
+            except ValueError:
+                pass
+
+        return None
+
+    def retry_delay(self, method: str, attempt: int, response=None, error=None) -> float | None:
+
+        """Seconds to wait before the next attempt, None when the request must not be retried."""
+
+        if attempt >= self.max_attempts:
+            return None
+
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+
+        if error is not None:
+            if idempotent or isinstance(error, self.not_sent_errors()):
+                return self.backoff(attempt)
+            return None
+
+        if response.status_code not in self.RETRY_STATUSES:
+            return None
+
+        if response.status_code != 429 and not idempotent:
+            return None
+
+        delay = self.server_delay(response)
+        if delay is None:
+            return self.backoff(attempt)
+        
+        # Small jitter so the waiting requests do not come back all at once
+        return delay + random.uniform(0, self.backoff_base)
+
+
+retry_policy = RetryPolicy(config.retry_max_attempts, config.retry_backoff_base, config.retry_backoff_max)
+
+
+def parse_json(response):
+
+    """Response body as JSON, non JSON bodies (e.g. a 502 HTML page) are returned as an error dict."""
+
+    try:
+        return response.json()
+    except ValueError:
+        return {"error": response.text[:1000]}
 
 
 def handle_api_errors(response, endpoint):
@@ -46,38 +446,23 @@ def handle_api_errors(response, endpoint):
         error_message = f"Error {response.status_code} for {endpoint}: {response.text}"
         logging.error(error_message)
         
-        return response.status_code, response.json(), True
+        return response.status_code, parse_json(response), True
     
     return None, None, False
 
 
-def request_with_retry(method, url, **kwargs):
+def record_response(url, response, roundtrip):
 
-    """Generic request function with retry for rate limiting, timing, extra sleep time, and error handling."""
-    start = time.time()
-    response = super_http.request(method, url, **kwargs)
-    roundtrip = time.time() - start
+    """Metrics of a response: status, latency and the bytes on the wire."""
 
-        # New rule: Check rate limit remaining and sleep if needed
-    rate_limit_remaining = int(response.headers.get('x-organization-rate-limit-remaining', 240))
-    reset_time =  (datetime.fromtimestamp(int(response.headers.get('x-organization-rate-limit-reset', 0))) - datetime.now()).total_seconds()
-    
-    if rate_limit_remaining <= 11 and reset_time >= 17:
-        
-        log_request(url, response.status_code, 5)  # Log this event
-        time.sleep(5)  # Sleep for 7 seconds to relieve the API
+    sent = int(response.request.headers.get('content-length') or 0)
+    metrics.record_request(url, response.status_code, roundtrip, sent, response.num_bytes_downloaded or len(response.content))
+
+
+def handle_response(response, url):
+
+    """Status code and body of a final response, API errors are logged."""
 
-    if response.status_code == 429:
-        
-        reset_timestamp = int(response.headers.get('x-organization-rate-limit-reset', 0))
-        sleep_time = (datetime.fromtimestamp(reset_timestamp) - datetime.now()).total_seconds() + 1
-        time.sleep(max(0, sleep_time))
-        retry_start = time.time()
-        response = super_http.request(method, url, **kwargs)
-        roundtrip = time.time() - retry_start
-    
-    log_request(url, response.status_code, roundtrip)
-    
     # Handle specific error codes
     status_code, error_response, has_error = handle_api_errors(response, url)
     
@@ -85,151 +470,170 @@ def request_with_retry(method, url, **kwargs):
 
         return status_code, error_response
     
-    return response.status_code, response.json()
+    return response.status_code, parse_json(response)
 
 
-def get_data(headers, endp_url, params):
-    
-    status_code, response = request_with_retry('GET', endp_url, headers=headers, params=params)
-    
-    if isinstance(response, dict) or status_code in {200, 201}:
-    
-        return status_code, response
-    
-    else:
-        # Handle non-JSON responses or unexpected outcomes
-    
-        return status_code, {"error": f"{response.text}"}
+def conditional_headers(headers, entry):
 
+    """Request headers plus the validators of a stale cache entry."""
 
-def post_data(headers, endp_url, payload):
-    
-    status_code, response = request_with_retry('POST', endp_url, headers=headers, data=payload)
-    
-    if isinstance(response, dict) or status_code in {200, 201}:
-    
-        return status_code, response
-    
-    else:
-    
-        # Handle non-JSON responses or unexpected outcomes
-        return status_code, {"error": f"{response.text}"}
+    headers = dict(headers or {})
+
+    if entry is not None:
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+    return headers
+
+
+def store_response(key, url, response, status_code, body):
+
+    """Keep a successful JSON response in the cache."""
 
+    if status_code == 200 and not (isinstance(body, dict) and set(body) == {"error"}):
+        get_response_cache().put(key, url, response.content, response.headers.get('etag'), response.headers.get('last-modified'))
 
 
-# ASYNC for Asyncio and not Asyncio corrutines.
+def next_link(page: dict) -> str | None:
 
-#Async client not within multiple stupid corrutines
-a_client = httpx.AsyncClient(limits=limits, timeout=timeout)
-# Initialize the local logger
-local_logger = setup_api_calls_logger()
+    """URL of the next page from the _links.next cursor, None on the last page."""
+
+    links = page.get('_links') or {}
+    next_page = links.get('next') if isinstance(links, dict) else None
+
+    if isinstance(next_page, dict):
+        return next_page.get('href')
+
+    return next_page or None
+
+
+# ASYNC for Asyncio and not Asyncio corrutines: the request engine, every request (sync or async) goes through a_send_with_retry
 
 async def a_log_request(endpoint, status_code, roundtrip):
 
     """Log the request details including the time taken and status code."""
-    message = f"Status Code {status_code}: {endpoint} time: {roundtrip:.5f} seconds"
-    loop = asyncio.get_running_loop()
 
-    await loop.run_in_executor(None, local_logger.info, message)
+    # El logger es de cola (logging_service), el record solo se encola, no hace falta un executor
+    logging.info(f"Status Code {status_code}: {endpoint} time: {roundtrip:.5f} seconds")
 
 
-async def a_handle_api_errors(response, endpoint):
+async def a_send_with_retry(client, method, url, **kwargs):
 
-    """Handle specific API error responses."""
-    if response.status_code in {400, 401, 403, 404, 405}:
+    """
+    The request engine: send a request following the rate limit governor and the retry policy, return
+    the last httpx response. client=None uses the pooled client of the running loop.
 
-        error_message = f"Error {response.status_code} for {endpoint}: {response.text}"
-        logging.error(error_message)
-        
-        return response.status_code, response.json(), True
-    
-    return None, None, False
+    Raises the transport error once it can not be retried any more.
+    """
+
+    import httpx
+
+    if client is None:
+        client = AsyncConnectorSingleton.get_instance()
+
+    attempt = 0
+
+    while True:
+
+        attempt += 1
+        with metrics.busy('rate_limit'):
+            waited = await governor.a_acquire()
+        if waited:
+            await a_log_request(url, 'throttled', waited)
+            metrics.record_sleep('rate_limit', waited)
+
+        start = time.perf_counter()
+        try:
+            with metrics.busy('api'):
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            metrics.record_request(url, type(e).__name__, time.perf_counter() - start)
+            delay = retry_policy.retry_delay(method, attempt, error=e)
+            if delay is None:
+                logging.error(f"{method} {url} failed after {attempt} attempts: {e!r}")
+                raise
+            await a_log_request(url, type(e).__name__, time.perf_counter() - start)
+            metrics.record_retry(url)
+            metrics.record_sleep('backoff', delay)
+            with metrics.busy('backoff'):
+                await asyncio.sleep(delay)
+            continue
+
+        roundtrip = time.perf_counter() - start
+        governor.update(response.headers)
+        await a_log_request(url, response.status_code, roundtrip)
+        record_response(url, response, roundtrip)
+
+        delay = retry_policy.retry_delay(method, attempt, response=response)
+        if delay is None:
+            return response
+
+        metrics.record_retry(url)
+
+        if response.status_code == 429:
+            # The governor holds every request, not only this one, until the quota is back (counted as rate_limit wait)
+            governor.block_until(time.time() + delay)
+        else:
+            metrics.record_sleep('backoff', delay)
+            with metrics.busy('backoff'):
+                await asyncio.sleep(delay)
 
 
 async def a_request_with_retry(client, method, url, **kwargs):
 
-    start = datetime.now()
-    response = await client.request(method, url, **kwargs)
-    roundtrip = (datetime.now() - start).total_seconds()
+    import httpx
 
-    rate_limit_remaining = int(response.headers.get('x-organization-rate-limit-remaining', 240))
-    reset_time = (datetime.fromtimestamp(int(response.headers.get('x-organization-rate-limit-reset', 0))) - datetime.now()).total_seconds()
-    
-    if rate_limit_remaining <= 11 and reset_time >= 17:
+    try:
+        response = await a_send_with_retry(client, method, url, **kwargs)
+    except httpx.TransportError as e:
+        return None, {"error": str(e) or type(e).__name__}
 
-        await a_log_request(url, response.status_code, 7)
-        await asyncio.sleep(7)
-    
-    if response.status_code == 429:
+    return handle_response(response, url)
 
-        reset_timestamp = int(response.headers.get('x-organization-rate-limit-reset', 0))
-        sleep_time = (datetime.fromtimestamp(reset_timestamp) - datetime.now()).total_seconds() + 1
 
-        await a_log_request(url, response.status_code, sleep_time)
-        await asyncio.sleep(max(0, sleep_time))
-        
-        retry_start = datetime.now()
-        response = await client.request(method, url, **kwargs)
-        roundtrip = (datetime.now() - retry_start).total_seconds()
-    
-    await a_log_request(url, response.status_code, roundtrip)
-    
-    status_code, error_response, has_error = await a_handle_api_errors(response, url)
+async def a_cached_get(client, headers, endp_url, params):
 
-    if has_error:
+    """GET through the response cache: fresh entries skip the API, stale ones are revalidated."""
 
-        return status_code, error_response
-    
-    return response.status_code, response.json()
+    import httpx
+
+    response_cache = get_response_cache()
+    key = response_cache.key(endp_url, params, headers)
+    # SQLite bloquea, las llamadas al cache van en un thread para no frenar el loop
+    entry = await asyncio.to_thread(response_cache.get, key, endp_url)
+
+    if entry is not None and entry.fresh:
+        metrics.record_cache(endp_url)
+        return 200, entry.json()
+
+    try:
+        response = await a_send_with_retry(client, 'GET', endp_url, headers=conditional_headers(headers, entry), params=params)
+    except httpx.TransportError as e:
+        return None, {"error": str(e) or type(e).__name__}
+
+    if response.status_code == 304 and entry is not None:
+        await asyncio.to_thread(response_cache.refresh, key)
+        metrics.record_cache(endp_url, revalidated=True)
+        return 200, entry.json()
+
+    status_code, body = handle_response(response, endp_url)
+    await asyncio.to_thread(store_response, key, endp_url, response, status_code, body)
+
+    return status_code, body
 
 
 
 async def aa_request_with_retry(method, url, **kwargs):
    
     """Generic request function with retry for rate limiting, timing, extra sleep time, and error handling."""
-    start = datetime.now()
-    response = await a_client.request(method, url, **kwargs)
-    roundtrip = (datetime.now() - start).total_seconds()
-    
-    # New rule: Check rate limit remaining and sleep if needed
-    rate_limit_remaining = int(response.headers.get('x-organization-rate-limit-remaining', 240))
-    reset_time =  (datetime.fromtimestamp(int(response.headers.get('x-organization-rate-limit-reset', 5))) - datetime.now()).total_seconds()
-    
-    if rate_limit_remaining <= 25 and reset_time >= 10:
-        
-        await a_log_request(url, response.status_code, 5)  # Log this event
-        await asyncio.sleep(5)  # Sleep for 7 seconds to relieve the API
-    
-    
-    if response.status_code == 429:
-
-        reset_timestamp = int(response.headers.get('x-organization-rate-limit-reset', 0))
-        sleep_time = (datetime.fromtimestamp(reset_timestamp) - datetime.now()).total_seconds() + 1
-        
-        await a_log_request(url, response.status_code, sleep_time)
-        await asyncio.sleep(max(0, sleep_time))
-        
-        retry_start = datetime.now()
-        response = await a_client.request(method, url, **kwargs)
-        roundtrip = (datetime.now() - retry_start).total_seconds()
-    
-    
-    await a_log_request(url, response.status_code, roundtrip)
-    
-    # Handle specific error codes
-    status_code, error_response, has_error = await a_handle_api_errors(response, url)
-    
-    if has_error:
-        
-        return status_code, error_response
-    
-    return response.status_code, response.json()
+    return await a_request_with_retry(None, method, url, **kwargs)
 
 
-# Functions using a_client directly (no client passed)
-async def aa_get_data(headers, endp_url, params):
+def as_data(status_code, response) -> tuple:
 
-    status_code, response = await aa_request_with_retry('GET', endp_url, headers=headers, params=params)
+    """(status, json body) of a request, {"error": text} when the body is not json and the status is not 200 / 201."""
 
     if isinstance(response, dict) or status_code in {200, 201}:
 
@@ -238,71 +642,176 @@ async def aa_get_data(headers, endp_url, params):
     else:
 
         return status_code, {"error": f"{response.text}"}
-    
 
-async def aa_post_data(headers, endp_url, payload):
-   
-    status_code, response = await aa_request_with_retry('POST', endp_url, headers=headers, data=payload)
-   
-    if isinstance(response, dict) or status_code in {200, 201}:
-   
-        return status_code, response
-   
-    else:
-   
-        return status_code, {"error": response.text}
 
+# Una corrutina por verbo, client=None usa el cliente del pool del loop que corre
+async def a_get_data(headers, endp_url, params, client=None):
 
-async def aa_put_data(headers, endp_url, payload):
-    
-    status_code, response = await aa_request_with_retry('PUT', endp_url, headers=headers, data=payload)
-    
-    if isinstance(response, dict) or status_code in {200, 201}:
-    
-        return status_code, response
-    
+    if get_response_cache() is not None:
+        status_code, response = await a_cached_get(client, headers, endp_url, params)
     else:
-    
-        return status_code, {"error": response.text}
+        status_code, response = await a_request_with_retry(client, 'GET', endp_url, headers=headers, params=params)
 
+    return as_data(status_code, response)
 
 
-# Functions that require the client to be passed as an argument from the multuple corrutines de miercoles
-async def a_get_data(headers, client, endp_url, params):
-    
-    status_code, response = await a_request_with_retry(client, 'GET', endp_url, headers=headers, params=params)
-    
-    if isinstance(response, dict) or status_code in {200, 201}:
-    
-        return status_code, response
-    
-    else:
-    
-        return status_code, {"error": response.text}
-
+async def a_post_data(headers, endp_url, payload, client=None):
 
-async def a_post_data(headers, endp_url, payload, client):
-    
     status_code, response = await a_request_with_retry(client, 'POST', endp_url, headers=headers, data=payload)
-    
-    if isinstance(response, dict) or status_code in {200, 201}:
-    
-        return status_code, response
-    
-    else:
-    
-        return status_code, {"error": response.text}
 
+    return as_data(status_code, response)
 
 
-async def a_put_data(headers, endp_url, payload, client):
+async def a_put_data(headers, endp_url, payload, client=None):
 
     status_code, response = await a_request_with_retry(client, 'PUT', endp_url, headers=headers, data=payload)
 
-    if isinstance(response, dict) or status_code in {200, 201}:
+    return as_data(status_code, response)
 
-        return status_code, response
 
-    else:
+# Nombres anteriores, sin cliente
+aa_get_data = a_get_data
+aa_post_data = a_post_data
+aa_put_data = a_put_data
+
+
+async def a_iter_records(headers, page: dict, items_key: str):
+
+    """Async version of iter_records, the next page request runs as a task while the current page is consumed."""
+
+    seen_links = set()
+
+    while page is not None:
+
+        url = next_link(page)
+        if url in seen_links:
+            url = None
+        seen_links.add(url)
+
+        task = asyncio.create_task(aa_get_data(headers, url, None)) if url else None
+
+        try:
+            for record in page.get(items_key) or []:
+                yield record
+        except BaseException:
+            if task is not None:
+                task.cancel()
+            raise
+
+        page = None
+
+        if task is not None:
+
+            status_code, next_page = await task
+
+            if status_code == 200 and isinstance(next_page, dict):
+                page = next_page
+            else:
+                logging.error(f"Pagination stopped at {url} - status: {status_code} - {next_page}")
+
+
+async def aa_get_paginated(headers, endp_url, params, items_key):
+
+    """Async version of get_paginated using a_client."""
+
+    status_code, page = await aa_get_data(headers, endp_url, params)
+
+    if status_code != 200 or not isinstance(page, dict):
+
+        return status_code, page
+
+    return status_code, a_iter_records(headers, page, items_key)
+
+
+##############NO Async###################################
+# Sync facade: the same engine run on the background loop (same pool, governor, retries and metrics)
+
+
+def send_with_retry(method, url, **kwargs):
+
+    """Sync version of a_send_with_retry, return the last httpx response.
+
+    Raises the transport error once it can not be retried any more."""
+
+    return run_sync(a_send_with_retry(None, method, url, **kwargs))
+
+
+def request_with_retry(method, url, **kwargs):
+
+    """Generic request function with retry for rate limiting, timing, extra sleep time, and error handling."""
+
+    return run_sync(a_request_with_retry(None, method, url, **kwargs))
+
+
+def cached_get(headers, endp_url, params):
+
+    """GET through the response cache: fresh entries skip the API, stale ones are revalidated."""
+
+    return run_sync(a_cached_get(None, headers, endp_url, params))
+
+
+def get_data(headers, endp_url, params):
+
+    return run_sync(aa_get_data(headers, endp_url, params))
+
+
+def post_data(headers, endp_url, payload):
+
+    return run_sync(aa_post_data(headers, endp_url, payload))
+
+
+def put_data(headers, endp_url, payload):
+
+    return run_sync(aa_put_data(headers, endp_url, payload))
+
+
+def iter_records(headers, page: dict, items_key: str):
+
+    """Yield the records of a page and of every following page, the next page is fetched while the current one is consumed."""
+
+    seen_links = set()
+
+    while page is not None:
+
+        url = next_link(page)
+        if url in seen_links:
+            url = None
+        seen_links.add(url)
+
+        # The next page is already on its way (on the engine loop) while the caller processes this one
+        future = engine.submit(aa_get_data(headers, url, None)) if url else None
+
+        try:
+            yield from page.get(items_key) or []
+        except BaseException:
+            if future is not None:
+                future.cancel()
+            raise
+
+        page = None
+
+        if future is not None:
+
+            status_code, next_page = future.result()
+
+            if status_code == 200 and isinstance(next_page, dict):
+                page = next_page
+            else:
+                logging.error(f"Pagination stopped at {url} - status: {status_code} - {next_page}")
+
+
+def get_paginated(headers, endp_url, params, items_key):
+
+    """
+    Like get_data but following the _links.next cursor.
+
+    Returns (status, iterator of records) when the first page is fetched, (status, error response) otherwise.
+    """
+
+    status_code, page = get_data(headers, endp_url, params)
+
+    if status_code != 200 or not isinstance(page, dict):
+
+        return status_code, page
 
-        return status_code, {"error": response.text}
+    return status_code, iter_records(headers, page, items_key)
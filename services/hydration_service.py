@@ -0,0 +1,232 @@
+import os
+import asyncio
+from collections import deque
+from contextlib import aclosing, AsyncExitStack
+from config.configuration import config
+from services.logging_service import my_logger
+from services.profiling_service import profiled_phase
+from services.metrics_service import metrics
+from services.cache_service import build_test_detail_cache
+from services.connector_service import AsyncConnectorSingleton, a_request_with_retry, run_in_session
+from services.thousandeyes_service import (
+    URL,
+    a_iter_account_tests,
+    _account_aliases,
+    _named_tests,
+    load_name_allocators,
+    save_name_allocators,
+    names_state_path,
+)
+from controller.create_terraform import TerraformFileWriter, resource_block
+
+RESOURCES_FILE = "resources.tf"
+# Sin shards, un archivo por account group: un export parcial no pisa los de los otros
+ACCOUNT_RESOURCES_FILE = "resources_{alias}.tf"
+
+
+def resources_path(file_path: str, alias: str, sharded: bool) -> str:
+
+    """resources.tf of the shard, or resources_<alias>.tf in the project when it is not sharded."""
+
+    if sharded:
+        return os.path.join(file_path, alias, RESOURCES_FILE)
+
+    return os.path.join(file_path, ACCOUNT_RESOURCES_FILE.format(alias=alias))
+
+
+async def a_fetch_test_detail(aid, test: dict, cache=None) -> tuple:
+
+    """Details of one test, (status, detail). From the cache while the test modifiedDate does not change."""
+
+    test_id = test["testId"]
+    modified = test.get("modifiedDate")
+    url = f'{URL}tests/{test["type"]}/{test_id}'
+
+    if cache is not None:
+        # SQLite bloquea, en un thread para no frenar las otras requests del loop
+        detail = await asyncio.to_thread(cache.get, aid, test_id, modified)
+        if detail is not None:
+            metrics.record_cache(url)
+            return 200, detail
+
+    # Directo al cliente del pool: el cache de respuestas por TTL no aporta nada aqui
+    status, detail = await a_request_with_retry(
+        AsyncConnectorSingleton.get_instance(), 'GET', url, headers=config.headers, params={"aid": aid, "expand": "agent"}
+    )
+
+    if status == 200 and isinstance(detail, dict) and cache is not None:
+        await asyncio.to_thread(cache.put, aid, test_id, modified, detail)
+
+    return status, detail
+
+
+async def a_hydrate_tests(items, window: int, cache=None):
+
+    """
+    Yield (item, status, detail) for every (alias, aid, resource_name, resource_type, test) item of the
+    async iterator items, in order.
+
+    At most window detail requests are in flight (they still go through the rate limit governor) and
+    at most 4 * window finished details wait for a slower request ahead of them, so 10k tests never
+    turn into 10k tasks at once.
+    """
+
+    window = max(1, window)
+    semaphore = asyncio.Semaphore(window)
+    pending = deque()
+
+    async def fetch(aid, test):
+        async with semaphore:
+            return await a_fetch_test_detail(aid, test, cache)
+
+    try:
+
+        async for item in items:
+
+            pending.append((item, asyncio.create_task(fetch(item[1], item[4]))))
+
+            if len(pending) >= 4 * window:
+                item, task = pending.popleft()
+                yield (item, *await task)
+
+        while pending:
+            item, task = pending.popleft()
+            yield (item, *await task)
+
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+async def a_listed_tests(aliases: list, allocator, max_concurrency: int, failures: list | None = None, listed: set | None = None):
+
+    """
+    Yield the (alias, aid, resource_name, resource_type, test) items of every account group as the
+    /tests pages arrive. The aliases listed go to listed, the account groups that failed to failures.
+    """
+
+    async with aclosing(a_iter_account_tests(aliases, max_concurrency)) as responses:
+
+        async for (acc_name, alias, aid), status, tests in responses:
+
+            if status != 200:
+                my_logger.warning(f"Failed to retrieve tests from {acc_name} - status: {status} - {tests}")
+                if failures is not None and acc_name not in failures:
+                    failures.append(acc_name)
+                continue
+
+            if listed is not None:
+                listed.add(alias)
+
+            async for raw in tests:
+                for name, _, resource_type, test in _named_tests(allocator, (raw,)):
+                    yield alias, aid, name, resource_type, test
+
+
+@profiled_phase("hydrate_resources")
+async def a_export_resources(
+    account_groups: dict,
+    file_path: str | None = None,
+    window: int | None = None,
+    max_concurrency: int | None = None,
+    names_state: str | None = None,
+    atomic: bool | None = None,
+    sharded: bool | None = None,
+    failures: list | None = None,
+    failed_tests: list | None = None,
+) -> int:
+
+    """
+    Write a full resource block per test to <project>/resources_<alias>.tf, or <project>/<alias>/resources.tf
+    when sharded. Only the files of the account groups in this run are regenerated.
+    """
+
+    if file_path is None:
+        file_path = os.path.join(os.getcwd(), config.terraform_project_path)
+
+    if window is None:
+        window = config.hydrate_window
+
+    if max_concurrency is None:
+        max_concurrency = config.fetch_concurrency
+
+    if names_state is None:
+        names_state = names_state_path()
+
+    if atomic is None:
+        atomic = config.tf_atomic_write
+
+    if sharded is None:
+        sharded = config.tf_sharded
+
+    account_allocator, test_allocator = load_name_allocators(names_state)
+    aliases = _account_aliases(account_groups, account_allocator)
+
+    cache = build_test_detail_cache()
+    written = failed = 0
+    # Resource blocks por alias, para shards.json
+    counts = {}
+    listed = set()
+
+    os.makedirs(file_path, exist_ok=True)
+
+    legacy = os.path.join(file_path, RESOURCES_FILE)
+    if not sharded and os.path.exists(legacy):
+        my_logger.warning(f'{legacy} is from an older version, the resources now go to resources_<alias>.tf: remove it or terraform will find every resource twice')
+
+    try:
+        async with aclosing(a_listed_tests(aliases, test_allocator, max_concurrency, failures, listed)) as items, AsyncExitStack() as files:
+
+            def open_resources(alias):
+                path = resources_path(file_path, alias, sharded)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                counts[alias] = 0
+                return files.enter_context(TerraformFileWriter(path, mode='w', atomic=atomic, buffer_size=config.tf_write_buffer))
+
+            current = writer = None
+
+            async for (alias, aid, name, resource_type, test), status, detail in a_hydrate_tests(items, window, cache):
+
+                # Los items llegan en orden de account group, un archivo abierto a la vez
+                if alias != current:
+                    await files.aclose()
+                    current = alias
+                    writer = open_resources(alias)
+
+                if status == 200 and isinstance(detail, dict):
+                    writer.write(resource_block(alias, name, resource_type, detail))
+                    written += 1
+                    counts[alias] += 1
+                else:
+                    failed += 1
+                    my_logger.warning(f"Failed to retrieve the details of test {test['testId']} - status: {status} - {detail}")
+                    if failed_tests is not None:
+                        failed_tests.append(str(test['testId']))
+
+            # Account groups listados sin tests: su archivo queda vacio
+            for alias in listed - counts.keys():
+                open_resources(alias)
+
+    finally:
+        if cache is not None:
+            cache.close()
+
+    save_name_allocators(names_state, account_allocator, test_allocator)
+
+    if sharded:
+        from controller.shard_terraform import write_manifest, file_digest
+        write_manifest(file_path, [
+            {"alias": alias, "path": alias, "resource_blocks": count, "resources_sha256": file_digest(resources_path(file_path, alias, True))}
+            for alias, count in counts.items()
+        ])
+
+    my_logger.info(f'{written} resource blocks written to {len(counts)} resource files of {file_path} ({failed} failed)')
+
+    return written
+
+
+def run_resource_export(account_groups: dict, **kwargs) -> int:
+
+    """Sync entry point of a_export_resources."""
+
+    return run_in_session(a_export_resources(account_groups, **kwargs))
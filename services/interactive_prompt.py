@@ -4,13 +4,14 @@ from colorama import Fore, Style, Back
 from config.configuration import config
 from services.thousandeyes_service import get_account_groups, get_existant_tests
 from services.logging_service import my_logger
-from controller.create_terraform import create_import_terraform
+from services.profiling_service import profiled_phase, profile_run
 
 def banner():
     with open('Assets/banner.txt', 'r') as file:
         banner = file.read()
     print(banner)
 
+@profiled_phase("select_accounts")
 def select_accounts() -> dict:
 
     print(f'\n{Back.YELLOW}[INFO]{Style.RESET_ALL} Fetching account groups from ThousandEyes...')
@@ -96,36 +97,75 @@ def user_prompt():
 
             #Get template
             if mission == 1:
-                
-                # The user selects the AG from which gather all data
-                account_groups = select_accounts()
-                my_logger.info(f'User selected the following account groups {account_groups.keys()}')
 
+                # Las metricas se reinician en cada mision, el reporte es solo de esta
+                from services.metrics_service import metrics, report_metrics
+                metrics.reset()
 
-                # Ahora el flow sera el siguiente:
-                # 1. Obtener los tests de esos AG,
-                tests = get_existant_tests(account_groups)
-                my_logger.info(f'Number of tests obtained: {len(tests)}')
-                
-                # 2. Generar el terraform file con esos tests
+                # PROFILE=time|cprofile|tracemalloc escribe el reporte por fase (PROFILE_REPORT)
+                with profile_run(logger=my_logger):
 
-                # Core functionality
-                start = time.time()
-                print(f'\n{Back.GREEN}[INFO]{Style.RESET_ALL} Generating Terraform import blocks...')
-                my_logger.info('Generating Terraform import blocks')
+                    # The user selects the AG from which gather all data
+                    account_groups = select_accounts()
+                    my_logger.info(f'User selected the following account groups {account_groups.keys()}')
 
-                tests_created = create_import_terraform(existing_tests=tests)
 
-                if tests_created:
+                    # Ahora el flow sera el siguiente:
+                    # 1. Obtener los tests de esos AG,
+                    # 2. Generar el terraform file con esos tests
+                    # con el pipeline los dos pasos se traslapan: cada AG se escribe en cuanto llegan sus tests
+                    start = time.time()
 
-                    print(f'\n{Back.GREEN}[INFO]{Style.RESET_ALL} All tests have been added to the Terraform file.')
-                    my_logger.info('All tests have been added to the Terraform file.')
+                    if config.export_pipeline and not config.tf_sharded:
 
+                        print(f'\n{Back.GREEN}[INFO]{Style.RESET_ALL} Fetching tests and generating Terraform import blocks...')
+                        my_logger.info('Generating Terraform import blocks (pipeline)')
 
-                roundtrip = time.time() - start
+                        from services.pipeline_service import run_export_pipeline
+                        tests_written = run_export_pipeline(account_groups)
+                        my_logger.info(f'Number of import blocks written: {tests_written}')
+                        tests_created = True
 
-                print(f'\n{Back.GREEN}[INFO]{Style.RESET_ALL} File created in {roundtrip/60} minutes')
-                my_logger.info(f'File created in {roundtrip/60} minutes')
+                    else:
+
+                        tests = get_existant_tests(account_groups, concurrent=config.async_fetch)
+                        my_logger.info(f'Number of tests obtained: {len(tests)}')
+
+                        # Core functionality
+                        print(f'\n{Back.GREEN}[INFO]{Style.RESET_ALL} Generating Terraform import blocks...')
+                        my_logger.info('Generating Terraform import blocks')
+
+                        # Los generadores se importan aqui, el menu no los necesita para arrancar
+                        if config.tf_sharded:
+                            from controller.shard_terraform import create_sharded_terraform
+                            tests_created = bool(create_sharded_terraform(existing_tests=tests))
+                        else:
+                            from controller.create_terraform import create_import_terraform
+                            tests_written = create_import_terraform(existing_tests=tests)
+                            my_logger.info(f'Number of import blocks written: {tests_written}')
+                            tests_created = True
+
+                    if config.export_resources:
+
+                        print(f'\n{Back.GREEN}[INFO]{Style.RESET_ALL} Fetching the test details and generating the resource blocks...')
+
+                        from services.hydration_service import run_resource_export
+                        resources_written = run_resource_export(account_groups)
+                        my_logger.info(f'Number of resource blocks written: {resources_written}')
+
+                    if tests_created:
+
+                        print(f'\n{Back.GREEN}[INFO]{Style.RESET_ALL} All tests have been added to the Terraform file.')
+                        my_logger.info('All tests have been added to the Terraform file.')
+
+
+                    roundtrip = time.time() - start
+
+                    print(f'\n{Back.GREEN}[INFO]{Style.RESET_ALL} File created in {roundtrip/60} minutes')
+                    my_logger.info(f'File created in {roundtrip/60} minutes')
+
+                # Tiempo en la API vs rate limit vs nuestro codigo
+                print(f'\n{report_metrics(my_logger)}')
 
 
             #Exit
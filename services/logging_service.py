@@ -1,54 +1,112 @@
+import os
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from config.configuration import config
 
 ########### Configurar logging ########################################################
 
+# Los loggers solo encolan el record, un listener thread lo escribe en el archivo que le toca
+log_queue = queue.SimpleQueue()
+_file_handlers = []
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _file_handler(filename: str, logger_name: str, fmt: str) -> RotatingFileHandler:
+
+    # Configurar un handler para escribir logs en un archivo con rotación automática
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    file_handler = RotatingFileHandler(filename=filename, maxBytes=config.log_max_bytes, backupCount=config.log_backup_count)
+    file_handler.setFormatter(logging.Formatter(fmt))
+
+    # El listener comparte la cola entre los loggers, cada archivo solo recibe los records de su logger
+    file_handler.addFilter(logging.Filter(logger_name))
+
+    return file_handler
+
+
+def start_log_listener() -> None:
+
+    """Start the listener thread that writes the queued records (idempotent)."""
+
+    global _listener
+
+    with _listener_lock:
+        if _listener is None:
+            _listener = QueueListener(log_queue, *_file_handlers, respect_handler_level=True)
+            _listener.start()
+
+
+def stop_log_listener() -> None:
+
+    """Write what is still queued and stop the listener thread, called at exit."""
+
+    global _listener
+
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def _restart_in_child() -> None:
+
+    # Un proceso hijo (fork) hereda la cola pero no el thread, necesita su propio listener
+    global log_queue, _listener, _listener_lock
+
+    _listener_lock = threading.Lock()
+
+    if _listener is None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    for logger_name in ("endpoint_logger", "api_calls_logger"):
+        for handler in logging.getLogger(logger_name).handlers:
+            if isinstance(handler, QueueHandler):
+                handler.queue = log_queue
+
+    _listener = None
+    start_log_listener()
+
+
+atexit.register(stop_log_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def _setup_queue_logger(logger_name: str, level: int, filename: str, fmt: str) -> logging.Logger:
+
+    logger = logging.getLogger(logger_name)
 
-def setup_standard_logger():
-    # Obtener el logger estándar de Python
-    logger = logging.getLogger("endpoint_logger")
-    
     # Verificar si el logger ya tiene handlers (lo que significa que ya fue configurado)
     if not logger.hasHandlers():
 
-        logger.setLevel(logging.DEBUG)
-
-        # Configurar un handler para escribir logs en un archivo con rotación automática
-        file_handler = RotatingFileHandler(filename='./logs/app.log', maxBytes=10000, backupCount=5)
-        
-        # Configurar el formato del log
-        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-        file_handler.setFormatter(formatter)
-        
-        # Agregar el handler al logger
-        logger.addHandler(file_handler)
-    
+        logger.setLevel(level)
+
+        with _listener_lock:
+            _file_handlers.append(_file_handler(filename, logger_name, fmt))
+
+        # El hot path solo paga el enqueue, el formato y la escritura se hacen en el listener
+        logger.addHandler(QueueHandler(log_queue))
+
+        # Reiniciar el listener para que incluya el handler nuevo
+        stop_log_listener()
+        start_log_listener()
+
     return logger
 
 
+def setup_standard_logger():
+    # Obtener el logger estándar de Python
+    return _setup_queue_logger("endpoint_logger", logging.DEBUG, os.path.join(config.log_dir, 'app.log'), "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+
 my_logger = setup_standard_logger()
 
 
 def setup_api_calls_logger():
     # Crear el logger para las llamadas de API
-    logger = logging.getLogger("api_calls_logger")
-    
-    # Verificar si ya está configurado
-    if not logger.hasHandlers():
-
-        logger.setLevel(logging.INFO)
-        
-        # Configurar un handler para escribir logs en un archivo con rotación automática
-        file_handler = RotatingFileHandler(filename='./logs/api_calls.log', maxBytes=10000, backupCount=5)
-        
-        # Configurar el formato del log
-        formatter = logging.Formatter('%(asctime)s:%(levelname)s:%(message)s')
-        file_handler.setFormatter(formatter)
-        
-        # Agregar el handler al logger
-        logger.addHandler(file_handler)
-
-    
-    return logger
-
+    return _setup_queue_logger("api_calls_logger", logging.INFO, os.path.join(config.log_dir, 'api_calls.log'), '%(asctime)s:%(levelname)s:%(message)s')
@@ -0,0 +1,315 @@
+import json
+import math
+import time
+import random
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from config.configuration import config
+from services.cache_service import ResponseCache
+
+# Upper bounds (seconds) of the Prometheus latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Latencies kept per endpoint for the percentiles, past this a uniform sample (reservoir) of the run
+LATENCY_SAMPLES = 4096
+
+
+def percentile(sorted_values: list, q: float) -> float:
+
+    """Nearest rank percentile of an already sorted list, 0.0 when empty."""
+
+    if not sorted_values:
+        return 0.0
+
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+
+class EndpointStats:
+
+    """Counters of one endpoint (first path segment after /v7/, e.g. "tests")."""
+
+    __slots__ = ('requests', 'statuses', 'latency_sum', 'latencies', 'buckets', 'retries', 'bytes_sent', 'bytes_received', 'cache_hits', 'revalidated')
+
+    def __init__(self):
+
+        self.requests = 0
+        self.statuses = Counter()
+        self.latency_sum = 0.0
+        self.latencies = []  # reservoir of at most LATENCY_SAMPLES
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.cache_hits = 0
+        self.revalidated = 0
+
+
+class BusyClock:
+
+    """Wall time with at least one request in a state, concurrent requests count once."""
+
+    __slots__ = ('active', 'since', 'total')
+
+    def __init__(self):
+
+        self.active = 0
+        self.since = 0.0
+        self.total = 0.0
+
+    def enter(self, now: float) -> None:
+
+        if not self.active:
+            self.since = now
+        self.active += 1
+
+    def exit(self, now: float) -> None:
+
+        self.active -= 1
+        if not self.active:
+            self.total += now - self.since
+
+    def value(self, now: float) -> float:
+
+        return self.total + (now - self.since if self.active else 0.0)
+
+    def restart(self, now: float) -> None:
+
+        # Las requests en curso siguen contando desde ahora
+        self.total = 0.0
+        self.since = now
+
+
+# api (request in flight), rate_limit (governor), backoff (retry sleep), any (one of them)
+BUSY_STATES = ('api', 'rate_limit', 'backoff', 'any')
+
+
+class ConnectorMetrics:
+
+    """
+    Per endpoint request counts, status codes, latencies and bytes of the connector, plus the wall time
+    with requests in flight, waiting on the rate limit governor or on a retry backoff (busy clocks, the
+    states can overlap each other). The latency, rate limit and backoff totals are summed per request.
+    """
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self.clocks = {state: BusyClock() for state in BUSY_STATES}
+        self.reset()
+
+    def reset(self) -> None:
+
+        """Start of a run: the entry points call it so every export reports only its own requests."""
+
+        with self._lock:
+            self.started = time.time()
+            self.endpoints: dict[str, EndpointStats] = {}
+            self.sleeps = Counter()  # rate_limit / backoff -> seconds, summed per request
+            now = time.perf_counter()
+            for clock in self.clocks.values():
+                clock.restart(now)
+
+    @contextmanager
+    def busy(self, state: str):
+
+        """Count the block in the wall time of state (api, rate_limit or backoff) and of any."""
+
+        with self._lock:
+            now = time.perf_counter()
+            self.clocks[state].enter(now)
+            self.clocks['any'].enter(now)
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                now = time.perf_counter()
+                self.clocks[state].exit(now)
+                self.clocks['any'].exit(now)
+
+    def _stats(self, url: str) -> EndpointStats:
+
+        endpoint = ResponseCache.endpoint(url) if url else ''
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        return stats
+
+    def record_request(self, url: str, status, seconds: float, bytes_sent: int = 0, bytes_received: int = 0) -> None:
+
+        """One request sent to the API, status is the status code or the transport error name."""
+
+        with self._lock:
+            stats = self._stats(url)
+            stats.requests += 1
+            stats.statuses[str(status)] += 1
+            stats.latency_sum += seconds
+            if len(stats.latencies) < LATENCY_SAMPLES:
+                stats.latencies.append(seconds)
+            else:
+                # Algorithm R: every request of the run has the same chance of being in the sample
+                slot = self._random.randrange(stats.requests)
+                if slot < LATENCY_SAMPLES:
+                    stats.latencies[slot] = seconds
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[i] += 1
+                    break
+
+    def record_retry(self, url: str) -> None:
+
+        with self._lock:
+            self._stats(url).retries += 1
+
+    def record_sleep(self, kind: str, seconds: float) -> None:
+
+        """Time held before sending: rate_limit (governor) or backoff (retry policy), summed per request."""
+
+        if seconds > 0:
+            with self._lock:
+                self.sleeps[kind] += seconds
+
+    def record_cache(self, url: str, revalidated: bool = False) -> None:
+
+        """A GET answered from the response cache, revalidated when the API returned 304."""
+
+        with self._lock:
+            stats = self._stats(url)
+            if revalidated:
+                stats.revalidated += 1
+            else:
+                stats.cache_hits += 1
+
+    def summary(self) -> dict:
+
+        with self._lock:
+
+            endpoints = {}
+            for endpoint, stats in sorted(self.endpoints.items()):
+                latencies = sorted(stats.latencies)
+                endpoints[endpoint or '-'] = {
+                    'requests': stats.requests,
+                    'statuses': dict(stats.statuses),
+                    'retries': stats.retries,
+                    'cache_hits': stats.cache_hits,
+                    'revalidated': stats.revalidated,
+                    'latency_total': round(stats.latency_sum, 6),
+                    'latency_p50': round(percentile(latencies, 50), 6),
+                    'latency_p95': round(percentile(latencies, 95), 6),
+                    'latency_p99': round(percentile(latencies, 99), 6),
+                    'bytes_sent': stats.bytes_sent,
+                    'bytes_received': stats.bytes_received,
+                }
+
+            now = time.perf_counter()
+            elapsed = time.time() - self.started
+            busy = {state: clock.value(now) for state, clock in self.clocks.items()}
+
+            return {
+                'elapsed': round(elapsed, 6),
+                # Wall time: con requests en vuelo, esperando al governor, en backoff, y sin ninguna request pendiente
+                'api_wall': round(busy['api'], 6),
+                'rate_limit_wall': round(busy['rate_limit'], 6),
+                'backoff_wall': round(busy['backoff'], 6),
+                'idle_wall': round(max(0.0, elapsed - busy['any']), 6),
+                # Summed per request (overlap between concurrent requests)
+                'rate_limit_wait': round(self.sleeps['rate_limit'], 6),
+                'backoff_wait': round(self.sleeps['backoff'], 6),
+                'endpoints': endpoints,
+            }
+
+    def format_summary(self) -> str:
+
+        """End of run table, one line per endpoint."""
+
+        summary = self.summary()
+        lines = [
+            f"API metrics, {summary['elapsed']:.1f}s run (wall time): requests in flight {summary['api_wall']:.1f}s, "
+            f"rate limit wait {summary['rate_limit_wall']:.1f}s, retry backoff {summary['backoff_wall']:.1f}s, "
+            f"no request pending {summary['idle_wall']:.1f}s",
+            f"  summed per request: rate limit wait {summary['rate_limit_wait']:.1f}s, retry backoff {summary['backoff_wait']:.1f}s",
+            f"  {'endpoint':16} {'requests':>8} {'retries':>7} {'cached':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'MB in':>8}  statuses",
+        ]
+
+        for endpoint, stats in summary['endpoints'].items():
+            statuses = ', '.join(f'{status}: {count}' for status, count in sorted(stats['statuses'].items()))
+            lines.append(
+                f"  {endpoint:16} {stats['requests']:8d} {stats['retries']:7d} {stats['cache_hits'] + stats['revalidated']:6d} "
+                f"{stats['latency_p50']:7.3f}s {stats['latency_p95']:7.3f}s {stats['latency_p99']:7.3f}s "
+                f"{stats['bytes_received'] / 1048576:8.2f}  {statuses}"
+            )
+
+        return '\n'.join(lines)
+
+    def to_json(self) -> str:
+
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self) -> str:
+
+        """Prometheus text exposition format (for the node exporter textfile collector or a pushgateway)."""
+
+        with self._lock:
+
+            now = time.perf_counter()
+
+            lines = [
+                '# TYPE te_api_requests_total counter',
+                *(f'te_api_requests_total{{endpoint="{e}",status="{s}"}} {n}'
+                  for e, stats in sorted(self.endpoints.items()) for s, n in sorted(stats.statuses.items())),
+                '# TYPE te_api_retries_total counter',
+                *(f'te_api_retries_total{{endpoint="{e}"}} {stats.retries}' for e, stats in sorted(self.endpoints.items())),
+                '# TYPE te_api_cache_hits_total counter',
+                *(f'te_api_cache_hits_total{{endpoint="{e}"}} {stats.cache_hits + stats.revalidated}' for e, stats in sorted(self.endpoints.items())),
+                '# TYPE te_api_bytes_total counter',
+                *(f'te_api_bytes_total{{endpoint="{e}",direction="{d}"}} {n}'
+                  for e, stats in sorted(self.endpoints.items()) for d, n in (('sent', stats.bytes_sent), ('received', stats.bytes_received))),
+                '# HELP te_api_wait_seconds_total Seconds held before sending, summed per request',
+                '# TYPE te_api_wait_seconds_total counter',
+                *(f'te_api_wait_seconds_total{{reason="{kind}"}} {self.sleeps[kind]:.6f}' for kind in ('rate_limit', 'backoff')),
+                '# HELP te_api_busy_seconds_total Wall seconds with at least one request in the state',
+                '# TYPE te_api_busy_seconds_total counter',
+                *(f'te_api_busy_seconds_total{{state="{state}"}} {clock.value(now):.6f}' for state, clock in self.clocks.items()),
+                '# TYPE te_api_request_duration_seconds histogram',
+            ]
+
+            for e, stats in sorted(self.endpoints.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'te_api_request_duration_seconds_bucket{{endpoint="{e}",le="{bound}"}} {cumulative}')
+                lines.append(f'te_api_request_duration_seconds_bucket{{endpoint="{e}",le="+Inf"}} {stats.requests}')
+                lines.append(f'te_api_request_duration_seconds_sum{{endpoint="{e}"}} {stats.latency_sum:.6f}')
+                lines.append(f'te_api_request_duration_seconds_count{{endpoint="{e}"}} {stats.requests}')
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str) -> None:
+
+        """Write the metrics to path, Prometheus text for .prom files and JSON otherwise."""
+
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus() if path.endswith('.prom') else self.to_json())
+
+
+metrics = ConnectorMetrics()
+
+
+def report_metrics(logger=None) -> str:
+
+    """End of run summary, logged and exported to METRICS_FILE when it is set."""
+
+    text = metrics.format_summary()
+
+    if logger is not None:
+        logger.info(text)
+
+    if config.metrics_file:
+        metrics.export(config.metrics_file)
+
+    return text
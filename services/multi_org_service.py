@@ -0,0 +1,285 @@
+"""
+Export several ThousandEyes orgs in parallel, one process per org.
+
+The orgs come from a JSON file (ORGS_FILE, orgs.json by default, keep it out of git):
+
+    {
+      "defaults": {"FETCH_CONCURRENCY": 10, "TF_SHARDED": "true"},
+      "orgs": [
+        {"name": "Acme", "api_token_env": "ACME_TOKEN", "output": "terraform/acme", "all": true},
+        {"name": "Globex", "api_token": "...", "output": "terraform/globex", "match": ["^prod"], "env": {"RATE_LIMIT": 1000}}
+      ]
+    }
+
+"name" has to be the ThousandEyes organization name (the account groups are filtered by it), unless
+"org_name" gives it and "name" is just the label of the org in the logs and the summary.
+
+Every org runs run_batch_export in a fresh spawned process: the .env settings are overridden with the
+org token, name, output path, "defaults" and the org "env" before the config is imported, so each
+worker has its own config, HTTP clients and rate limit governor (the quota is per org). The logs and
+the console output of an org go to <LOG_DIR>/<org>/.
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Codes of services/batch_export.py, this module is imported by the workers before their config exists
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_PARTIAL = 4
+
+SELECTOR_KEYS = ("accounts", "aids", "match", "all")
+
+# Progress events of the worker, set by the pool initializer
+_events = None
+
+
+def org_slug(name: str) -> str:
+
+    return re.sub(r"[^\w-]+", "_", name.strip().lower()).strip("_") or "org"
+
+
+def load_orgs(path: str, only=(), log_dir: str = "./logs") -> list:
+
+    """
+    Read and validate the orgs file, returns one dict per org with its name, slug, selectors and env.
+
+    Raises ValueError with the reason when the file or an org is not valid (missing token, duplicated
+    name or output path, ...). With only, just the orgs with those names are returned. The logs of
+    every org go to log_dir/<org slug> unless "defaults" sets another LOG_DIR.
+    """
+
+    with open(path, "r") as f:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}")
+
+    if not isinstance(data, dict) or not isinstance(data.get("orgs"), list) or not data["orgs"]:
+        raise ValueError(f'{path} needs a non empty "orgs" list')
+
+    defaults = {key: str(value) for key, value in (data.get("defaults") or {}).items()}
+    orgs, slugs, outputs = [], set(), set()
+
+    for index, entry in enumerate(data["orgs"]):
+
+        name = entry.get("name") if isinstance(entry, dict) else None
+        if not name:
+            raise ValueError(f'org #{index + 1} of {path} has no "name"')
+
+        token = entry.get("api_token") or os.getenv(entry.get("api_token_env") or "", "")
+        if not token:
+            raise ValueError(f'org {name!r} has no "api_token" (or "api_token_env" is not set)')
+
+        output = entry.get("output")
+        if not output:
+            raise ValueError(f'org {name!r} has no "output" path')
+
+        slug = org_slug(name)
+        if slug in slugs:
+            raise ValueError(f"org {name!r} is listed twice")
+        if os.path.abspath(output) in outputs:
+            raise ValueError(f"org {name!r} writes to {output}, already used by another org")
+
+        slugs.add(slug)
+        outputs.add(os.path.abspath(output))
+
+        org_log_dir = os.path.join(defaults.get("LOG_DIR", log_dir), slug)
+
+        env = {
+            **defaults,
+            **{key: str(value) for key, value in (entry.get("env") or {}).items()},
+            "ORG_NAME": entry.get("org_name") or name,
+            "API_TOKEN": token,
+            "TERRAFORM_PROJECT_PATH": output,
+            "LOG_DIR": org_log_dir,
+            # Cada proceso hace su propio reporte, no deben pisarse entre orgs
+            "PROFILE": "",
+            "METRICS_FILE": os.path.join(org_log_dir, "metrics.json"),
+        }
+        if entry.get("api_url"):
+            env["TE_API_URL"] = entry["api_url"]
+
+        selectors = {key: entry[key] for key in SELECTOR_KEYS if entry.get(key)}
+
+        orgs.append({
+            "name": name,
+            "slug": slug,
+            "output": output,
+            "log_dir": org_log_dir,
+            "accounts": list(selectors.get("accounts", [])),
+            "aids": [str(aid) for aid in selectors.get("aids", [])],
+            "match": list(selectors.get("match", [])),
+            # Sin selectores se exporta el org completo
+            "all": bool(selectors.get("all")) or not selectors,
+            "env": env,
+        })
+
+    if only:
+        missing = set(only) - {org["name"] for org in orgs}
+        if missing:
+            raise ValueError(f"orgs not found in {path}: {', '.join(sorted(missing))}")
+        orgs = [org for org in orgs if org["name"] in only]
+
+    return orgs
+
+
+def _init_worker(events) -> None:
+
+    global _events
+    _events = events
+
+
+def _emit(*event) -> None:
+
+    if _events is not None:
+        _events.put(event)
+
+
+def _empty_result(name: str, error: str | None = None) -> dict:
+
+    return {"name": name, "code": EXIT_ERROR, "account_groups": 0, "imports": 0, "resources": 0, "failures": [], "failed_tests": [],
+            "requests": 0, "retries": 0, "rate_limit_wait": 0.0, "seconds": 0.0, "error": error}
+
+
+def export_org(org: dict) -> dict:
+
+    """Worker: export one org with run_batch_export, returns its summary (never raises)."""
+
+    start = time.time()
+    result = _empty_result(org["name"])
+
+    _emit("start", org["name"], os.getpid())
+
+    # Antes de importar el config: .env solo completa lo que no este en el environment
+    os.environ.update(org["env"])
+    os.makedirs(org["log_dir"], exist_ok=True)
+    os.makedirs(org["output"], exist_ok=True)
+
+    with open(os.path.join(org["log_dir"], "export.out"), "w") as out, contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+
+        try:
+            from services.batch_export import run_batch_export
+            from services.metrics_service import metrics
+
+            summary = {}
+            result["code"] = run_batch_export(org["accounts"], org["aids"], org["match"], org["all"], summary=summary)
+            result.update({key: summary[key] for key in ("account_groups", "imports", "resources", "failures", "failed_tests") if key in summary})
+
+            totals = metrics.summary()
+            result["requests"] = sum(stats["requests"] for stats in totals["endpoints"].values())
+            result["retries"] = sum(stats["retries"] for stats in totals["endpoints"].values())
+            result["rate_limit_wait"] = totals["rate_limit_wall"]
+
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            print(f"Export of {org['name']} failed: {result['error']}")
+
+    result["seconds"] = round(time.time() - start, 3)
+    _emit("done", org["name"], result["code"])
+
+    return result
+
+
+def format_summary(results: list) -> str:
+
+    """End of run table, one line per org plus the totals."""
+
+    lines = [f"{'org':28} {'status':>8} {'groups':>7} {'imports':>8} {'resources':>9} {'requests':>9} {'retries':>8} {'seconds':>8}"]
+
+    for result in results:
+        status = "ok" if result["code"] == EXIT_OK else ("partial" if result["code"] == EXIT_PARTIAL else f"exit {result['code']}")
+        lines.append(
+            f"{result['name'][:28]:28} {status:>8} {result['account_groups']:7d} {result['imports']:8d} {result['resources']:9d} "
+            f"{result['requests']:9d} {result['retries']:8d} {result['seconds']:8.1f}"
+        )
+
+    lines.append(
+        f"{'total':28} {sum(r['code'] == EXIT_OK for r in results):>5}/{len(results):<2} "
+        f"{sum(r['account_groups'] for r in results):7d} {sum(r['imports'] for r in results):8d} "
+        f"{sum(r['resources'] for r in results):9d} {sum(r['requests'] for r in results):9d} "
+        f"{sum(r['retries'] for r in results):8d}"
+    )
+
+    for result in results:
+        if result.get("error"):
+            lines.append(f"{result['name']}: {result['error']}")
+        if result["failures"]:
+            lines.append(f"{result['name']}: failed {', '.join(result['failures'])}")
+        if result["failed_tests"]:
+            lines.append(f"{result['name']}: {len(result['failed_tests'])} test details failed")
+
+    return "\n".join(lines)
+
+
+def exit_code(results: list) -> int:
+
+    """0 when every org finished cleanly, the code of the orgs when all failed the same way, 4 otherwise."""
+
+    codes = {result["code"] for result in results}
+
+    if codes == {EXIT_OK}:
+        return EXIT_OK
+    if len(codes) == 1:
+        return codes.pop()
+    return EXIT_PARTIAL
+
+
+def run_multi_org(orgs: list, workers: int = 4) -> int:
+
+    """Export the orgs of load_orgs in a process pool, shows the combined progress and returns the exit code."""
+
+    from tqdm import tqdm
+
+    workers = max(1, min(workers, len(orgs)))
+    # spawn + un proceso por org: ningun worker hereda el config, los clientes o el governor de otro org
+    context = multiprocessing.get_context("spawn")
+    events = context.Queue()
+    results, running = {}, set()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(events,), max_tasks_per_child=1) as pool:
+
+        futures = {pool.submit(export_org, org): org for org in orgs}
+
+        with tqdm(total=len(orgs), desc=f"Exporting {len(orgs)} orgs ({workers} workers)", unit=" orgs") as bar:
+
+            while len(results) < len(orgs):
+
+                try:
+                    kind, name, *_ = events.get(timeout=0.5)
+                    if kind == "start":
+                        running.add(name)
+                    else:
+                        running.discard(name)
+                    bar.set_postfix_str(", ".join(sorted(running))[:60])
+                except queue.Empty:
+                    pass
+
+                for future, org in futures.items():
+
+                    if org["name"] in results or not future.done():
+                        continue
+
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # El proceso murio (BrokenProcessPool, OOM ...), el resto de orgs sigue
+                        result = _empty_result(org["name"], f"{type(e).__name__}: {e}")
+
+                    results[org["name"]] = result
+                    running.discard(org["name"])
+                    bar.update(1)
+                    bar.write(f"{org['name']}: {'ok' if result['code'] == EXIT_OK else 'exit ' + str(result['code'])}, "
+                              f"{result['imports']} import blocks, logs in {org['log_dir']}")
+
+    ordered = [results[org["name"]] for org in orgs]
+    print(format_summary(ordered))
+
+    return exit_code(ordered)
@@ -0,0 +1,101 @@
+import os
+import asyncio
+from contextlib import aclosing
+from config.configuration import config
+from services.logging_service import my_logger
+from services.profiling_service import profiled_phase
+from services.thousandeyes_service import (
+    a_iter_account_tests,
+    _account_aliases,
+    a_collect_tests,
+    load_name_allocators,
+    save_name_allocators,
+    names_state_path,
+)
+from services.connector_service import run_in_session
+from controller.create_terraform import ImportEmitter, iter_tests
+
+# Sentinel that closes a stage queue
+DONE = None
+
+
+@profiled_phase("export_pipeline")
+async def a_export_pipeline(
+    account_groups: dict,
+    file_path: str | None = None,
+    max_concurrency: int | None = None,
+    queue_size: int | None = None,
+    names_state: str | None = None,
+    atomic: bool | None = None,
+    incremental: bool | None = None,
+    failures: list | None = None,
+) -> int:
+
+    """
+    Fetch -> name -> write pipeline of the import blocks, every account group is written as soon as it is named.
+    Returns the import blocks written, the account groups that could not be fetched go to failures.
+    """
+
+    if file_path is None:
+        file_path = os.path.join(os.getcwd(), config.terraform_project_path)
+
+    if max_concurrency is None:
+        max_concurrency = config.fetch_concurrency
+
+    if queue_size is None:
+        queue_size = config.pipeline_queue_size
+
+    if names_state is None:
+        names_state = names_state_path()
+
+    account_allocator, test_allocator = load_name_allocators(names_state)
+    aliases = _account_aliases(account_groups, account_allocator)
+
+    named = asyncio.Queue(maxsize=max(1, queue_size))
+
+    async def transformer():
+        async with aclosing(a_iter_account_tests(aliases, max_concurrency)) as responses:
+
+            async for (acc_name, alias, aid), status, tests in responses:
+
+                if status == 200:
+                    batch = {}
+                    # Las paginas siguientes llegan mientras se nombran los tests
+                    await a_collect_tests(batch, test_allocator, alias, aid, tests)
+                    # El batch queda como TestTable, las tuplas de cada import se generan al escribir
+                    await named.put(batch)
+                else:
+                    my_logger.warning(f"Failed to retrieve tests from {acc_name} - status: {status} - {tests}")
+                    if failures is not None:
+                        failures.append(acc_name)
+
+        await named.put(DONE)
+
+    async def writer(emitter):
+        while (batch := await named.get()) is not DONE:
+            # File I/O in a thread so the fetches keep going while a batch is written
+            await asyncio.to_thread(emitter.emit_batch, iter_tests(batch))
+
+    with ImportEmitter(file_path, atomic=atomic, incremental=incremental) as emitter:
+
+        stages = [asyncio.create_task(stage) for stage in (transformer(), writer(emitter))]
+
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+            # Cancelling the transformer closes a_iter_account_tests, which cancels the fetches still running
+            await asyncio.gather(*stages, return_exceptions=True)
+
+    save_name_allocators(names_state, account_allocator, test_allocator)
+    my_logger.info(f'Export pipeline finished: {emitter.count} import blocks written, {emitter.skipped} already in the project')
+
+    return emitter.count
+
+
+def run_export_pipeline(account_groups: dict, **kwargs) -> int:
+
+    """Sync entry point of a_export_pipeline."""
+
+    return run_in_session(a_export_pipeline(account_groups, **kwargs))
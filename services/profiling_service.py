@@ -0,0 +1,219 @@
+"""
+Opt-in profiling of the export phases (PROFILE=time, optionally with cprofile and / or tracemalloc).
+
+    PROFILE=time,tracemalloc PROFILE_REPORT=profile_report.txt python main.py export --all
+
+Each phase decorated with profiled_phase records its calls, total and max time. With PROFILE unset the
+decorator returns the function untouched, so the export pays nothing for it. The report is written
+by profile_run at the end of the run, cProfile stats are also saved next to it as <report>.pstats.
+
+The requests of the sync functions run in the connector engine thread. Before Python 3.12 cProfile only
+sees the thread that enables it, so profile_run also profiles the engine thread and the report merges
+both (from 3.12 one profiler sees every thread and only one can be active).
+"""
+
+import io
+import sys
+import time
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from config.configuration import config
+
+PROFILE_MODES = {"time", "cprofile", "tracemalloc"}
+
+
+def profile_modes() -> set:
+
+    """PROFILE as a set of modes, any mode implies time (PROFILE=cprofile, PROFILE=1 -> time only, PROFILE=all)."""
+
+    modes = {mode.strip().lower() for mode in config.profile.split(",") if mode.strip()}
+
+    if not modes or modes <= {"0", "false", "no", "off"}:
+        return set()
+
+    if "all" in modes:
+        return set(PROFILE_MODES)
+
+    return (modes & PROFILE_MODES) | {"time"}
+
+
+class PhaseStats:
+
+    __slots__ = ('calls', 'total', 'max')
+
+    def __init__(self):
+
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class PhaseProfiler:
+
+    """Wall time per phase, thread safe (the pipeline writes the batches from a worker thread)."""
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self.phases: dict[str, PhaseStats] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+
+        with self._lock:
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = PhaseStats()
+            stats.calls += 1
+            stats.total += seconds
+            if seconds > stats.max:
+                stats.max = seconds
+
+    @contextmanager
+    def phase(self, name: str):
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def reset(self) -> None:
+
+        with self._lock:
+            self.phases = {}
+
+
+profiler = PhaseProfiler()
+
+
+def profiled_phase(name: str):
+
+    """Time every call of the decorated function (sync or async) as phase name, no-op when PROFILE is unset."""
+
+    def decorator(func):
+
+        if not profile_modes():
+            return func
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    profiler.add(name, time.perf_counter() - start)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.add(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def format_report(elapsed: float, cprofile=None, snapshot=None, peak: int | None = None) -> str:
+
+    """cprofile is a pstats.Stats (the main and engine thread profiles merged)."""
+
+    out = io.StringIO()
+    out.write(f"Run: {elapsed:.3f}s\n\n")
+    out.write(f"{'phase':28} {'calls':>9} {'total':>10} {'% run':>6} {'mean':>10} {'max':>10}\n")
+
+    with profiler._lock:
+        phases = sorted(profiler.phases.items(), key=lambda item: item[1].total, reverse=True)
+
+    for name, stats in phases:
+        share = stats.total / elapsed * 100 if elapsed else 0
+        out.write(
+            f"{name:28} {stats.calls:9d} {stats.total:9.3f}s {share:5.1f}% "
+            f"{stats.total / stats.calls * 1000:8.3f}ms {stats.max * 1000:8.1f}ms\n"
+        )
+
+    out.write("\nPhases nest and concurrent calls (fetch_account_tests) overlap, so the totals do not add up to the run.\n")
+
+    if snapshot is not None:
+        out.write(f"\ntracemalloc peak: {peak / 1048576:.2f} MB, top allocations:\n")
+        for stat in snapshot.statistics('lineno')[:15]:
+            out.write(f"  {stat}\n")
+
+    if cprofile is not None:
+        out.write("\ncProfile (main thread + connector engine thread), top 30 by cumulative time:\n")
+        cprofile.stream = out
+        cprofile.sort_stats('cumulative').print_stats(30)
+
+    return out.getvalue()
+
+
+@contextmanager
+def profile_run(report_path: str | None = None, logger=None):
+
+    """Profile the block when PROFILE is set and write the report to report_path (PROFILE_REPORT)."""
+
+    modes = profile_modes()
+
+    if not modes:
+        yield
+        return
+
+    report_path = report_path or config.profile_report
+    profiler.reset()
+    cprofile = engine_cprofile = None
+
+    if "tracemalloc" in modes:
+        import tracemalloc
+        tracemalloc.start()
+
+    if "cprofile" in modes:
+        import cProfile
+        from services.connector_service import engine
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+        if sys.version_info < (3, 12):
+            # Las requests de las funciones sync corren en el thread del engine
+            engine_cprofile = cProfile.Profile()
+            engine.profile(engine_cprofile)
+
+    start = time.perf_counter()
+
+    try:
+        yield profiler
+    finally:
+
+        elapsed = time.perf_counter() - start
+        snapshot = peak = stats = None
+
+        if cprofile is not None:
+            import pstats
+            cprofile.disable()
+            stats = pstats.Stats(cprofile)
+            if engine_cprofile is not None:
+                engine.profile(None)
+                stats.add(engine_cprofile)
+            stats.dump_stats(f"{report_path}.pstats")
+
+        if "tracemalloc" in modes:
+            # Lo que asignan el propio profiler y el import system no es parte del export
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "*/cProfile.py"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        with open(report_path, "w") as f:
+            f.write(format_report(elapsed, stats, snapshot, peak))
+
+        if logger is not None:
+            logger.info(f"Profile report written to {report_path}")
@@ -0,0 +1,107 @@
+import time
+import asyncio
+import threading
+from config.configuration import config
+
+# Seconds of the rate limit window (the quota is per minute), used when the API sends no reset header
+DEFAULT_WINDOW = 60.0
+
+
+class RateLimitGovernor:
+
+    """
+    Org-wide token bucket fed by the x-organization-rate-limit-* headers.
+
+    Every request (sync or async) takes a permit before it is sent, the bucket is refilled when
+    the reset time reported by ThousandEyes is reached. The local count is decremented before the
+    request leaves, so concurrent requests can not overshoot the quota the way the old per-response
+    check did. Without a reset header the window is assumed to last DEFAULT_WINDOW seconds.
+    """
+
+    def __init__(self, limit: int = 240, reserve: int = 2):
+
+        self._lock = threading.Lock()
+        self.limit = limit
+        self.reserve = reserve
+        self.remaining = limit
+        self.reset_at = 0.0  # epoch seconds, 0 while unknown
+
+    def _take_permit(self) -> float:
+
+        """Take a permit if there is one, otherwise return the seconds to wait before trying again."""
+
+        with self._lock:
+
+            now = time.time()
+
+            # The window is over, refill the bucket until the headers tell us otherwise
+            if self.reset_at and now >= self.reset_at:
+                self.remaining = self.limit
+                self.reset_at = 0.0
+
+            if self.remaining > self.reserve:
+                self.remaining -= 1
+                return 0.0
+
+            if not self.reset_at:
+                # Exhausted without a known reset time: assume a full window, otherwise it never refills
+                self.reset_at = now + DEFAULT_WINDOW
+
+            return max(self.reset_at - now, 0.0) + 0.1
+
+    async def a_acquire(self) -> float:
+
+        """Wait until a permit is available without blocking the event loop, return the seconds spent waiting."""
+
+        waited = 0.0
+        while wait := self._take_permit():
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+    def update(self, headers) -> None:
+
+        """Sync the bucket with the rate limit headers of a response."""
+
+        try:
+            remaining = int(headers.get('x-organization-rate-limit-remaining'))
+        except (TypeError, ValueError):
+            return
+
+        try:
+            reset_at = float(headers.get('x-organization-rate-limit-reset'))
+        except (TypeError, ValueError):
+            reset_at = None
+
+        try:
+            limit = int(headers.get('x-organization-rate-limit-limit'))
+        except (TypeError, ValueError):
+            limit = None
+
+        with self._lock:
+
+            if limit:
+                self.limit = limit
+
+            if reset_at is None:
+                # Sin header de reset: ventana fija desde la primera respuesta, la siguiente empieza cuando esta termine
+                reset_at = self.reset_at or time.time() + DEFAULT_WINDOW
+
+            if reset_at > self.reset_at:
+                # First response of a new window
+                self.reset_at = reset_at
+                self.remaining = remaining
+            else:
+                # Same window, requests still in flight were already taken from the local count
+                self.remaining = min(self.remaining, remaining)
+
+    def block_until(self, reset_at: float) -> None:
+
+        """Empty the bucket until reset_at (used after a 429)."""
+
+        with self._lock:
+            self.remaining = 0
+            self.reset_at = max(self.reset_at, reset_at, time.time() + 1)
+
+
+governor = RateLimitGovernor(limit=config.rate_limit, reserve=config.rate_limit_reserve)
@@ -0,0 +1,254 @@
+import threading
+from array import array
+from bisect import bisect_left
+from typing import NamedTuple
+
+
+class AccountGroup(NamedTuple):
+
+    """Key of get_existant_tests, still compares and unpacks like the (alias, aid) tuple."""
+
+    alias: str
+    aid: str
+
+
+class TestRecord(NamedTuple):
+
+    """One exported test, unpacks like the old [test_name, test_id, resource_type] list."""
+
+    name: str
+    test_id: str
+    resource_type: str
+
+
+class TestRow(NamedTuple):
+
+    """Row of helpers/list_tests.py (tests_list.csv)."""
+
+    account_name: str
+    aid: str
+    test_name: str
+    test_id: str
+    test_type: str
+
+
+class AgentRow(NamedTuple):
+
+    """Row of helpers/list_agents.py (agents_list.csv)."""
+
+    account_name: str
+    aid: str
+    agent_name: str
+    agent_id: str
+    agent_type: str
+    location: str
+
+
+# Los resource types son pocos (TF_MAP), se guardan como un codigo de 1 byte por test
+RESOURCE_TYPES = []
+_TYPE_CODES = {}
+_types_lock = threading.Lock()
+
+
+def _type_code(resource_type: str) -> int:
+
+    code = _TYPE_CODES.get(resource_type)
+
+    if code is None:
+        with _types_lock:
+            code = _TYPE_CODES.get(resource_type)
+            if code is None:
+                RESOURCE_TYPES.append(resource_type)
+                code = _TYPE_CODES[resource_type] = len(RESOURCE_TYPES) - 1
+
+    return code
+
+
+def _numeric_id(key: str) -> int | None:
+
+    # Solo si el str(int) da el mismo id (sin ceros a la izquierda, cabe en 64 bits)
+    if len(key) < 19 and key.isdigit() and key.isascii() and key[0] != '0':
+        return int(key)
+
+    return None
+
+
+class TestTable:
+
+    """
+    Column store of the tests of one account group, the values of the get_existant_tests dict.
+
+    Instead of a 3 element list per test it keeps one list of names, the numeric test ids in an
+    array('q') and the resource types as 1 byte codes, the TestRecord tuples are only built while
+    iterating. A non numeric test id moves the ids to a plain list of strings.
+    """
+
+    __slots__ = ('names', 'ids', 'types')
+
+    def __init__(self, records=()):
+
+        self.names = []
+        self.ids = array('q')
+        self.types = bytearray()
+
+        for record in records:
+            self.append(*record)
+
+    def append(self, name: str, test_id, resource_type: str) -> None:
+
+        test_id = str(test_id)
+
+        if isinstance(self.ids, array):
+            number = _numeric_id(test_id)
+            if number is not None:
+                self.ids.append(number)
+            else:
+                self.ids = [str(value) for value in self.ids]
+                self.ids.append(test_id)
+        else:
+            self.ids.append(test_id)
+
+        self.names.append(name)
+        self.types.append(_type_code(resource_type))
+
+    def __len__(self) -> int:
+
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> TestRecord:
+
+        return TestRecord(self.names[index], str(self.ids[index]), RESOURCE_TYPES[self.types[index]])
+
+    def __iter__(self):
+
+        for name, test_id, code in zip(self.names, self.ids, self.types):
+            yield TestRecord(name, str(test_id), RESOURCE_TYPES[code])
+
+    def __eq__(self, other) -> bool:
+
+        try:
+            return list(self) == [tuple(record) for record in other]
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+
+        return f'TestTable({list(self)!r})'
+
+
+class KeyNames:
+
+    """
+    {key: name} of NameAllocator (test id -> resource name) without a dict entry per test.
+
+    The numeric keys are kept sorted in an array('q') with the names in a parallel list (bisect to
+    find them), new keys wait in a small dict merged in once it passes 1/8 of the table. Other keys
+    go to a plain dict. get / add also take the key already passed through normalize.
+    """
+
+    __slots__ = ('ids', 'names', 'recent', 'other')
+
+    def __init__(self, items=()):
+
+        self.ids = array('q')
+        self.names = []
+        self.recent = {}
+        self.other = {}
+
+        for key, name in items:
+            self[key] = name
+
+        self._merge()
+
+    @staticmethod
+    def normalize(key: str) -> int | str:
+
+        number = _numeric_id(key)
+        return key if number is None else number
+
+    def _find(self, number: int) -> int:
+
+        index = bisect_left(self.ids, number)
+        return index if index < len(self.ids) and self.ids[index] == number else -1
+
+    def get(self, key, default=None):
+
+        if isinstance(key, str) and (key := self.normalize(key)).__class__ is str:
+            return self.other.get(key, default)
+
+        name = self.recent.get(key)
+        if name is not None or not self.ids or key > self.ids[-1]:
+            return default if name is None else name
+
+        index = self._find(key)
+        return self.names[index] if index >= 0 else default
+
+    def __setitem__(self, key: str, name: str) -> None:
+
+        key = self.normalize(key)
+        index = -1 if isinstance(key, str) else self._find(key)
+
+        if index >= 0:
+            self.names[index] = name
+        else:
+            self.add(key, name)
+
+    def add(self, key, name: str) -> None:
+
+        """__setitem__ for a key that is not in the table yet (NameAllocator just looked it up)."""
+
+        if isinstance(key, str) and (key := self.normalize(key)).__class__ is str:
+            self.other[key] = name
+            return
+
+        self.recent[key] = name
+        if len(self.recent) > max(4096, len(self.ids) >> 3):
+            self._merge()
+
+    def _merge(self) -> None:
+
+        """Move the recent keys into the sorted columns, copying the slices between them."""
+
+        if not self.recent:
+            return
+
+        recent = sorted(self.recent.items())
+
+        if not self.ids or recent[0][0] > self.ids[-1]:
+            # Caso comun: los ids nuevos son mayores que todos los anteriores
+            self.ids.extend(number for number, _ in recent)
+            self.names.extend(name for _, name in recent)
+            self.recent = {}
+            return
+
+        ids, names = array('q'), []
+        start = 0
+
+        for number, name in recent:
+            index = bisect_left(self.ids, number, start)
+            ids.extend(self.ids[start:index])
+            names.extend(self.names[start:index])
+            ids.append(number)
+            names.append(name)
+            start = index
+
+        ids.extend(self.ids[start:])
+        names.extend(self.names[start:])
+
+        self.ids, self.names, self.recent = ids, names, {}
+
+    def __len__(self) -> int:
+
+        return len(self.ids) + len(self.recent) + len(self.other)
+
+    def items(self):
+
+        for number, name in zip(self.ids, self.names):
+            yield str(number), name
+        for number, name in self.recent.items():
+            yield str(number), name
+        yield from self.other.items()
+
+    def values(self):
+
+        return (name for _, name in self.items())
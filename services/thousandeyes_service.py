@@ -1,10 +1,23 @@
+import os
 import re
-
-from services.connector_service import get_data
+import json
+import time
+import asyncio
+import itertools
+import threading
+from collections import deque
+from contextlib import aclosing
+
+from services.connector_service import get_data, aa_get_data, drop_cached, get_paginated, aa_get_paginated, run_in_session, ConnectorSession
 from config.configuration import config
 from services.logging_service import my_logger
+from services.profiling_service import profiled_phase
+from services.records import AccountGroup, TestTable, KeyNames
+
+URL = config.api_url.rstrip('/') + '/'
 
-URL = "https://api.thousandeyes.com/v7/"
+# Sentinel that closes the items queue of an account group
+DONE = None
 
 TF_MAP = {
     "agent-to-server": "thousandeyes_agent_to_server",
@@ -23,6 +36,17 @@ TF_MAP = {
 }
 
 
+INVALID_CHARS_RE = re.compile(r"[^\w\s-]")
+SEPARATORS_RE = re.compile(r"[\s-]+")
+
+
+def _sanitize(value: str) -> str:
+
+    value = INVALID_CHARS_RE.sub("", value.strip().lower())
+    return SEPARATORS_RE.sub("_", value).strip("_")
+
+
+@profiled_phase("naming")
 def format_terraform_identifier(
     raw_value: str | None,
     fallback_prefix: str = "te",
@@ -32,13 +56,7 @@ def format_terraform_identifier(
 ) -> str:
     """Normalize names so they are Terraform-friendly and optionally unique."""
 
-    if not raw_value:
-        base = fallback_prefix
-    else:
-        base = raw_value.strip().lower()
-        base = re.sub(r"[^\w\s-]", "", base)
-        base = re.sub(r"[\s-]+", "_", base)
-        base = base.strip("_") or fallback_prefix
+    base = (_sanitize(raw_value) if raw_value else "") or fallback_prefix
 
     if base[0].isdigit():
         base = f"{fallback_prefix}_{base}"
@@ -47,128 +65,523 @@ def format_terraform_identifier(
     if names_seen is None:
         return candidate
 
-    def sanitize_hint(value: str) -> str:
-        hint = value.strip().lower()
-        hint = re.sub(r"[^\w\s-]", "", hint)
-        hint = re.sub(r"[\s-]+", "_", hint)
-        return hint.strip("_")
-
     if candidate in names_seen:
         if unique_hint:
-            hint = sanitize_hint(unique_hint)
+            hint = _sanitize(unique_hint)
             if hint:
                 candidate_with_hint = f"{candidate}_{hint}"
-                if candidate_with_hint[0].isdigit():
-                    candidate_with_hint = f"{fallback_prefix}_{candidate_with_hint}"
                 if candidate_with_hint not in names_seen:
                     candidate = candidate_with_hint
 
     suffix = 2
     while candidate in names_seen:
         candidate = f"{base}_{suffix}"
-        if candidate[0].isdigit():
-            candidate = f"{fallback_prefix}_{candidate}"
         suffix += 1
 
     return candidate
 
 
-def get_account_groups() -> dict:
+class NameAllocator:
+
+    """
+    Unique Terraform names in O(1) per name.
+
+    Gives the same names as format_terraform_identifier with a names_seen set, but keeps the next free
+    suffix of every base name instead of probing _2, _3, ... from the start on each collision. With a
+    key (e.g. the test id) the name is remembered, and the state can be saved so the same test keeps
+    its name between incremental runs.
+    """
+
+    def __init__(self, fallback_prefix: str = "te", assigned: dict | None = None, next_suffix: dict | None = None):
+
+        self.fallback_prefix = fallback_prefix
+        # Un dict por test id costaba ~90 bytes por test, KeyNames ~16
+        self.assigned = KeyNames((str(key), name) for key, name in (assigned or {}).items())
+        self.next_suffix: dict[str, int] = dict(next_suffix or {})
+        # Names of the saved keys are reserved, no new test can take them
+        self.names: set[str] = set(self.assigned.values())
+
+    def base_name(self, raw_value: str | None) -> str:
+
+        base = (_sanitize(raw_value) if raw_value else "") or self.fallback_prefix
+
+        if base[0].isdigit():
+            base = f"{self.fallback_prefix}_{base}"
+
+        return base
+
+    @profiled_phase("naming")
+    def allocate(self, raw_value: str | None, unique_hint: str | None = None, key=None) -> str:
+
+        if key is not None:
+            key = KeyNames.normalize(str(key))
+            name = self.assigned.get(key)
+            if name is not None:
+                return name
+
+        base = self.base_name(raw_value)
+        candidate = base
+
+        if candidate in self.names and unique_hint:
+            hint = _sanitize(unique_hint)
+            if hint and f"{candidate}_{hint}" not in self.names:
+                candidate = f"{candidate}_{hint}"
+
+        if candidate in self.names:
+            suffix = self.next_suffix.get(base, 2)
+            while f"{base}_{suffix}" in self.names:
+                suffix += 1
+            candidate = f"{base}_{suffix}"
+            self.next_suffix[base] = suffix + 1
+
+        self.names.add(candidate)
+
+        if key is not None:
+            self.assigned.add(key, candidate)
+
+        return candidate
+
+    def state(self) -> dict:
+
+        return {"fallback_prefix": self.fallback_prefix, "assigned": dict(self.assigned.items()), "next_suffix": self.next_suffix}
+
+    def write_state(self, f) -> None:
+
+        """state() as JSON, the assigned names are written one by one instead of building the dict."""
+
+        f.write(f'{{"fallback_prefix": {json.dumps(self.fallback_prefix)}, "next_suffix": {json.dumps(self.next_suffix)}, "assigned": {{')
+        for i, (key, name) in enumerate(self.assigned.items()):
+            f.write(f'{", " if i else ""}{json.dumps(key)}: {json.dumps(name)}')
+        f.write('}}')
+
+    @classmethod
+    def from_state(cls, state: dict | None, fallback_prefix: str = "te") -> "NameAllocator":
+
+        state = state or {}
+        return cls(state.get("fallback_prefix", fallback_prefix), state.get("assigned"), state.get("next_suffix"))
+
+
+def names_state_path() -> str | None:
+
+    """File where the allocated names are kept between runs, None when NAMES_STATE_FILE is empty."""
+
+    if not config.names_state_file:
+        return None
+
+    return os.path.join(os.getcwd(), config.terraform_project_path, config.names_state_file)
+
+
+def load_name_allocators(path: str | None) -> tuple[NameAllocator, NameAllocator]:
+
+    """Allocators for the account aliases and the test names, restored from path if it exists."""
+
+    state = {}
+
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            my_logger.warning(f"Ignoring unreadable names state {path}: {e}")
+
+    return NameAllocator.from_state(state.get("accounts"), "account"), NameAllocator.from_state(state.get("tests"), "test")
+
+
+def save_name_allocators(path: str | None, accounts: NameAllocator, tests: NameAllocator) -> None:
+
+    if not path:
+        return
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+
+    with open(tmp_path, 'w') as f:
+        f.write('{"accounts": ')
+        accounts.write_state(f)
+        f.write(', "tests": ')
+        tests.write_state(f)
+        f.write('}')
+
+    os.replace(tmp_path, path)
+
+
+def _org_account_groups(status, account_groups) -> dict:
+
+    """{name: aid} of the configured org from the account-groups response."""
 
     accounts = {}
 
-    try:
+    if account_groups and status == 200:
 
-        status, account_groups = get_data(headers=config.headers, endp_url=URL + "account-groups", params={})
+        if "accountGroups" in account_groups and isinstance(account_groups["accountGroups"], list):
 
-        if account_groups and status == 200:
+            for acc in account_groups["accountGroups"]:
 
-            if "accountGroups" in account_groups and isinstance(account_groups["accountGroups"], list):
+                if isinstance(acc,dict) and acc.get("organizationName") == config.org_name:
 
-                for acc in account_groups["accountGroups"]:
+                    accounts.update({acc.get("accountGroupName"): acc.get("aid")})
 
-                    if isinstance(acc,dict) and acc.get("organizationName") == config.org_name:
+    else:
 
-                        accounts.update({acc.get("accountGroupName"): acc.get("aid")})
+        my_logger.error(f"Failed to fetch account groups. Status code: {status}, Response: {account_groups}")
+
+    return accounts
+
+
+def fetch_account_groups(fresh: bool = False) -> dict:
+
+    """Fetch the account groups of the configured org from the API, {name: aid}. fresh skips the HTTP cache."""
+
+    try:
+        if fresh:
+            drop_cached(config.headers, URL + "account-groups", {})
+        return _org_account_groups(*get_data(headers=config.headers, endp_url=URL + "account-groups", params={}))
 
-            return accounts
-        
-        else:
-            
-            my_logger.error(f"Failed to fetch account groups. Status code: {status}, Response: {account_groups}")
-            return accounts
-        
     except Exception as e:
-        
         my_logger.error(f"Error fetching account groups: {e}")
-        return accounts
+        return {}
+
+
+async def a_fetch_account_groups(fresh: bool = False) -> dict:
+
+    """Async version of fetch_account_groups, for the coroutines (the sync one blocks the loop)."""
+
+    try:
+        if fresh:
+            await asyncio.to_thread(drop_cached, config.headers, URL + "account-groups", {})
+        return _org_account_groups(*await aa_get_data(config.headers, URL + "account-groups", {}))
+
+    except Exception as e:
+        my_logger.error(f"Error fetching account groups: {e}")
+        return {}
+
+
+class AccountGroupRegistry:
+
+    """
+    Process-wide memo of the org account groups.
+
+    The list is fetched once and reused by every caller until refresh_interval seconds have passed
+    or invalidate() is called. Failed fetches (empty result) are not memoized, reloads skip the HTTP cache.
+    """
+
+    def __init__(self, refresh_interval: float):
+
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._by_name: dict | None = None
+        self._by_aid: dict = {}
+        self._loaded_at = 0.0
+        self._invalidated = False
+
+    def _stale(self, refresh: bool) -> bool:
+
+        return self._by_name is None or refresh or time.monotonic() - self._loaded_at >= self.refresh_interval
+
+    def _store(self, accounts: dict) -> None:
+
+        if accounts or self._by_name is None:
+            self._invalidated = False
+            self._by_name = accounts
+            self._by_aid = {str(aid): name for name, aid in accounts.items()}
+            self._loaded_at = time.monotonic() if accounts else 0.0
+
+    def _fresh(self, refresh: bool) -> bool:
+
+        # Recargas, refresh e invalidate van a la API: el TTL del cache HTTP no limita el refresh_interval
+        return refresh or self._invalidated or self._by_name is not None
+
+    def _load(self, refresh: bool = False) -> dict:
+
+        with self._lock:
+
+            if self._stale(refresh):
+                self._store(fetch_account_groups(fresh=self._fresh(refresh)))
+
+            return self._by_name
+
+    def all(self, refresh: bool = False) -> dict:
+
+        """Copy of {name: aid} so callers can filter it freely."""
+
+        return dict(self._load(refresh))
+
+    async def a_all(self, refresh: bool = False) -> dict:
+
+        """Async version of all(): the fetch does not block the loop (the lock is only held to store it)."""
+
+        if self._stale(refresh):
+            accounts = await a_fetch_account_groups(fresh=self._fresh(refresh))
+            with self._lock:
+                self._store(accounts)
+
+        return dict(self._by_name)
+
+    def by_name(self, name: str):
+
+        """aid of an account group, None if it does not exist."""
+
+        return self._load().get(name)
+
+    def require(self, name: str):
 
+        """aid of an account group, KeyError if it does not exist (like the old acc_aids[name])."""
 
-def get_existant_tests(account_groups: dict):
+        aid = self.by_name(name)
 
+        if aid is None:
+            raise KeyError(f"Account group {name!r} not found in {config.org_name}")
+
+        return aid
+
+    def by_aid(self, aid) -> str | None:
+
+        """Name of an account group, None if it does not exist."""
+
+        self._load()
+        return self._by_aid.get(str(aid))
+
+    def invalidate(self) -> None:
+
+        with self._lock:
+            self._by_name = None
+            self._by_aid = {}
+            self._loaded_at = 0.0
+            self._invalidated = True
+
+
+account_group_registry = AccountGroupRegistry(refresh_interval=config.account_groups_refresh)
+
+
+def get_account_groups(refresh: bool = False) -> dict:
+
+    return account_group_registry.all(refresh=refresh)
+
+
+async def a_get_account_groups(refresh: bool = False) -> dict:
+
+    return await account_group_registry.a_all(refresh=refresh)
+
+
+def _account_aliases(account_groups: dict, allocator: NameAllocator) -> list:
+
+    """Assign the provider alias of every account group, always in the same order."""
+
+    aliases = []
+
+    for acc_name, aid in account_groups.items():
+
+        alias = allocator.allocate(acc_name, unique_hint=str(aid), key=aid)
+        aliases.append((acc_name, alias, aid))
+
+    return aliases
+
+
+def _named_tests(allocator: NameAllocator, tests):
+
+    """Yield (resource_name, test_id, resource_type, test) for the valid tests of one account group."""
+
+    for test in tests:
+
+        if isinstance(test, dict):
+
+            if test.get("liveShare", False) or test.get("savedEvent", False):
+                # Not a valid test
+                continue
+
+            # Valid test will be added to the list
+            test_type = test.get("type")
+            test_id = test.get("testId")
+            test_name = test.get("testName")
+
+            if not test_type or not test_id or not test_name:
+                my_logger.warning("Skipping test with incomplete metadata: %s", test)
+                continue
+
+            resource_name = allocator.allocate(test_name, unique_hint=str(test_id), key=test_id)
+            resource_type = TF_MAP.get(test_type, "thousandeyes_unknown")
+
+            yield resource_name, str(test_id), resource_type, test
+
+
+def _collect_tests(existing_tests: dict, allocator: NameAllocator, alias: str, aid, tests):
+
+    """Add the valid tests of one account group to existing_tests (one TestTable per account group)."""
+
+    key = AccountGroup(alias, aid)
+    table = existing_tests.get(key) or TestTable()
+
+    for resource_name, test_id, resource_type, _ in _named_tests(allocator, tests):
+        table.append(resource_name, test_id, resource_type)
+
+    # Igual que antes, un account group sin tests validos no aparece en el dict
+    if table:
+        existing_tests[key] = table
+
+
+async def a_collect_tests(existing_tests: dict, allocator: NameAllocator, alias: str, aid, tests, chunk: int = 500):
+
+    """_collect_tests for an async iterator of tests, they are named in chunks as their pages arrive."""
+
+    batch = []
+
+    async for test in tests:
+        batch.append(test)
+        if len(batch) >= chunk:
+            _collect_tests(existing_tests, allocator, alias, aid, batch)
+            batch = []
+
+    _collect_tests(existing_tests, allocator, alias, aid, batch)
+
+
+@profiled_phase("fetch_account_tests")
+async def a_fetch_account_tests(aid) -> tuple:
+
+    """
+    First page of the tests of one account group, (status, async iterator of every test) or (status, error response).
+
+    The following pages are requested while the tests are consumed, the iterator has to be consumed
+    in the same connector session.
     """
-    Necesito: alias, aid , testname, type y test id para hacer el import, entonces lo que pudiera hacer seria: 
 
-    tests = {
-        ("sw_team", "1091056"): [["AHCTesting", "7486301","http_Server"], ["GettingStarted", "3015887","agent_to_Agent"]],
-        ("danis_sandbox", "2098765"): [["mx_test", "8564321","http_Server"]]
-    }
+    return await aa_get_paginated(config.headers, endp_url=f'{URL}tests', params={"aid": aid}, items_key="tests")
+
+
+async def _queued_items(queue: asyncio.Queue):
+
+    while (item := await queue.get()) is not DONE:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+async def a_iter_in_order(accounts: list, fetch_first_page, max_concurrency: int, buffer: int = 1000):
 
-    Igual y el type ya lo pudiera meter mappeado pero es lo mismo, ej: thousandeyes_http_server
     """
+    Yield (account, status, items) in order, fetching up to max_concurrency accounts ahead with at most
+    buffer items waiting each. items has to be consumed before the next account is yielded.
+    """
+
+    window = max(1, max_concurrency)
+    accounts = iter(accounts)
+    pending = deque()
+
+    async def fetch(account, queue):
+        try:
+            status, items = await fetch_first_page(account)
+            await queue.put((status, items if status != 200 else None))
+            if status == 200:
+                async for item in items:
+                    await queue.put(item)
+            await queue.put(DONE)
+        except Exception as e:
+            # El error sale por la cola, en el orden de los account groups
+            await queue.put(e)
+
+    def start(account):
+        queue = asyncio.Queue(maxsize=max(1, buffer))
+        pending.append((account, queue, asyncio.create_task(fetch(account, queue))))
+
+    task = None
 
     try:
-        existing_tests = {}
-        account_aliases: set[str] = set()
-        formatted_test_names: set[str] = set()
-
-        for acc_name, aid in account_groups.items():
-            
-            alias = format_terraform_identifier(
-                acc_name,
-                fallback_prefix="account",
-                names_seen=account_aliases,
-                unique_hint=str(aid),
-            )
-            
-            account_aliases.add(alias)
-            
-            url = f'{URL}tests'
-            status, tests = get_data(config.headers, endp_url=url, params={"aid": aid})
-
-            if status == 200 and isinstance(tests, dict):
-
-                for test in tests.get("tests", [{}]):
-                    
-                    if isinstance(test, dict):
-
-                        if test.get("liveShare", False) or test.get("savedEvent", False):
-                            # Not a valid test
-                            continue
-                        
-                        # Valid test will be added to the list
-                        test_type = test.get("type")
-                        test_id = test.get("testId")
-                        test_name = test.get("testName")
-
-                        if not test_type or not test_id or not test_name:
-                            my_logger.warning("Skipping test with incomplete metadata: %s", test)
-                            continue
-
-                        resource_name = format_terraform_identifier(
-                            test_name,
-                            fallback_prefix="test",
-                            names_seen=formatted_test_names,
-                            unique_hint=str(test_id),
-                        )
-                        formatted_test_names.add(resource_name)
-                        resource_type = TF_MAP.get(test_type, "thousandeyes_unknown")
-
-                        existing_tests.setdefault((alias, aid), []).append([resource_name, str(test_id), resource_type])
+        for account in itertools.islice(accounts, window):
+            start(account)
+
+        while pending:
+
+            account, queue, task = pending.popleft()
+
+            first = await queue.get()
+            if isinstance(first, Exception):
+                raise first
+
+            status, error = first
+            yield account, status, (_queued_items(queue) if status == 200 else error)
+
+            # Items not consumed by the caller are dropped
+            task.cancel()
+
+            if (account := next(accounts, None)) is not None:
+                start(account)
+
+    finally:
+        if task is not None:
+            task.cancel()
+        for _, _, pending_task in pending:
+            pending_task.cancel()
+
+
+def a_iter_account_tests(account_groups: list, max_concurrency: int, buffer: int = 1000):
+
+    """
+    a_iter_in_order over the tests: ((acc_name, alias, aid), status, tests) for every account group of
+    _account_aliases, in order.
+    """
+
+    return a_iter_in_order(account_groups, lambda account: a_fetch_account_tests(account[2]), max_concurrency, buffer)
+
+
+async def a_get_existant_tests(existing_tests: dict, allocator: NameAllocator, account_groups: list, max_concurrency: int, failures: list | None = None) -> None:
+
+    """
+    Concurrent part of get_existant_tests: collect the tests of every account group as they are fetched.
 
+    The pooled client is created in the running loop and closed before it ends (inside a bigger
+    session, e.g. run_in_session, the outer session closes it), so every asyncio.run gets its own.
+    """
+
+    async with ConnectorSession(), aclosing(a_iter_account_tests(account_groups, max_concurrency)) as responses:
+
+        async for (acc_name, alias, aid), status, tests in responses:
+
+            if status == 200:
+                await a_collect_tests(existing_tests, allocator, alias, aid, tests)
             else:
-                msg = f"Failed to retrieve tests from {acc_name} - status: {status} - {tests}"
-                my_logger.warning(msg)
+                my_logger.warning(f"Failed to retrieve tests from {acc_name} - status: {status} - {tests}")
+                if failures is not None:
+                    failures.append(acc_name)
+
+
+@profiled_phase("get_existant_tests")
+def get_existant_tests(account_groups: dict, concurrent: bool = False, max_concurrency: int | None = None, names_state: str | None = None, failures: list | None = None):
+
+    """
+    {AccountGroup(alias, aid): TestTable} with the name, id and type of every test, what the import blocks need.
+    concurrent=True fetches the account groups with asyncio, same output; failed account groups go to failures.
+    """
+
+    if names_state is None:
+        names_state = names_state_path()
+
+    try:
+        existing_tests = {}
+        account_allocator, test_allocator = load_name_allocators(names_state)
+        aliases = _account_aliases(account_groups, account_allocator)
+
+        if concurrent:
+
+            if max_concurrency is None:
+                max_concurrency = config.fetch_concurrency
+
+            run_in_session(a_get_existant_tests(existing_tests, test_allocator, aliases, max_concurrency, failures))
+
+        else:
+
+            for acc_name, alias, aid in aliases:
+
+                # Every request is done right before its tests are processed
+                status, tests = get_paginated(config.headers, endp_url=f'{URL}tests', params={"aid": aid}, items_key="tests")
+
+                if status == 200:
+                    _collect_tests(existing_tests, test_allocator, alias, aid, tests)
+                else:
+                    msg = f"Failed to retrieve tests from {acc_name} - status: {status} - {tests}"
+                    my_logger.warning(msg)
+                    if failures is not None:
+                        failures.append(acc_name)
+
+        save_name_allocators(names_state, account_allocator, test_allocator)
 
     except Exception as e:
         raise e
@@ -176,6 +589,3 @@ def get_existant_tests(account_groups: dict):
     my_logger.info(f'Total tests fetched: {sum(len(tests) for tests in existing_tests.values())}')
     
     return existing_tests
-
-
-